@@ -1,321 +1,913 @@
-import requests
+import asyncio
 import re
-from urllib.parse import unquote
+from collections import namedtuple
+from dataclasses import dataclass, fields, replace
+from urllib.parse import quote, unquote
 
+import aiohttp
 
-def get_person_info(name):
-    """Получает расширенную информацию о личности из Википедии и Викиданных."""
-    url = "https://ru.wikipedia.org/w/api.php"
-    params = {
-        "action": "query",
-        "format": "json",
-        "titles": name,
-        "prop": "extracts|pageprops|pageimages|info",
-        "exintro": True,
-        "explaintext": True,
-        "ppprop": "wikibase_item|disambiguation",
-        "pithumbsize": 500,
-        "piprop": "thumbnail|name",
-        "redirects": True,
-        "inprop": "url",
-    }
+from app import config
+from app.cache import cache
+from app.languages import LANGUAGES, keyed, language, pick
+from app.local_index import local_index
+from app.metrics import metrics
+from app.scheduler import backfill, has_deadline, scheduler, until_deadline
+from app.singleflight import SingleFlight
 
-    try:
-        response = requests.get(url, params=params)
-        data = response.json()
-        page = next(iter(data["query"]["pages"].values()))
-
-        if "missing" in page:
-            return {"error": "Статья не найдена в Википедии"}
-
-        # Проверка на disambiguation page
-        if page.get("pageprops", {}).get("disambiguation"):
-            return {"error": "Это страница неоднозначности, уточните запрос"}
-
-        wikidata_id = page.get("pageprops", {}).get("wikibase_item")
-        image_url = page.get("thumbnail", {}).get("source", "")
-        page_url = page.get("fullurl", "")
-
-        if not wikidata_id:
-            return {
-                "full_name": page["title"],
-                "summary": page.get("extract", ""),
-                "image_url": unquote(image_url) if image_url else None,
-                "page_url": page_url,
-                "error": "Нет данных из Викиданных",
-            }
-
-        # Получаем детали из Викиданных
-        wikidata_data = get_wikidata_info(wikidata_id)
-        if "error" in wikidata_data:
-            return wikidata_data
+WIKIPEDIA_API_URL = config.WIKIPEDIA_API_URL
+WIKIDATA_API_URL = config.WIKIDATA_API_URL
 
-        wikidata_data.update({
-            "summary": page.get("extract", ""),
-            "image_url": unquote(image_url) if image_url else None,
-            "page_url": page_url,
-            "wikipedia_title": page["title"],
-        })
-        return wikidata_data
+# Максимум идентификаторов в одном запросе wbgetentities
+WBGETENTITIES_LIMIT = 50
 
-    except Exception as e:
-        return {"error": f"Ошибка запроса: {str(e)}"}
+PAGE_NOT_FOUND = "Статья не найдена в Википедии"
+WIKIPEDIA_TIMEOUT = "Википедия не ответила вовремя, попробуйте ещё раз"
+WIKIDATA_TIMEOUT = "Викиданные не ответили вовремя"
 
+# Типы значений утверждений (datavalue.type)
+ITEM = "wikibase-entityid"
+TIME = "time"
+STRING = "string"
 
-def get_wikidata_info(wikidata_id):
-    """Извлекает расширенные структурированные данные из Викиданных."""
-    url = "https://www.wikidata.org/w/api.php"
-    params = {
-        "action": "wbgetentities",
-        "format": "json",
-        "ids": wikidata_id,
-        "props": "labels|claims|descriptions|aliases|sitelinks",
-        "languages": "ru",
-    }
+# Описание поля записи о личности:
+#   name — поле в записи, group — вложенный словарь (social_media и т.п.);
+#   value_type — тип значения, остальные утверждения пропускаются;
+#   cardinality — "one" (лучшее значение), "many" (список),
+#                 "any" (одно значение, список или None);
+#   format — преобразование значения (для ITEM применяется к названию);
+#   sections — разделы kb.more_info; пусто — поле основной карточки.
+ClaimField = namedtuple(
+    "ClaimField", "name value_type cardinality format group sections",
+    defaults=(None, None, ()))
 
-    try:
-        response = requests.get(url, params=params)
-        data = response.json()
-        entity = data["entities"][wikidata_id]
-
-        # Проверка, что это человек (Q5)
-        instance_of = [claim["mainsnak"]["datavalue"]["value"]["id"]
-                       for claim in entity.get("claims", {}).get("P31", [])
-                       if "datavalue" in claim["mainsnak"]]
-        if "Q5" not in instance_of:
-            return {"error": "Это не человек"}
 
-        # Основные данные
-        name = entity["labels"]["ru"]["value"]
-        description = entity["descriptions"].get("ru", {}).get("value", "")
+# Строка времени Викиданных: +1799-06-06T00:00:00Z
+_DATE_RE = re.compile(r'([+-]?\d+)-(\d+)-(\d+)T')
 
-        # Псевдонимы/альтернативные имена
-        aliases = [alias["value"] for alias in
-                   entity.get("aliases", {}).get("ru", [])]
 
-        # Даты рождения/смерти с более точным форматированием
-        birth_date = format_date(
-            get_claim_value(entity, "P569"))  # P569 = дата рождения
-        death_date = format_date(
-            get_claim_value(entity, "P570"))  # P570 = дата смерти
+def format_date(date_info):
+    time_str = date_info['time']
+    precision = date_info['precision']
 
-        # Место рождения/смерти
-        birth_place = get_claim_values(entity, "P19")  # P19 = место рождения
-        death_place = get_claim_values(entity, "P20")  # P20 = место смерти
+    # Проверяем, поддерживается ли точность (например, год, месяц, день)
+    if precision not in [9, 10, 11]:
+        return "Unsupported precision"
 
-        # Профессии и страны
-        occupations = get_claim_values(entity,
-                                       "P106")  # P106 = род деятельности
-        countries = get_claim_values(entity, "P27")  # P27 = страна гражданства
+    # Разбираем строку времени
+    match = _DATE_RE.match(time_str)
+    if not match:
+        return "Invalid time format"
 
-        # Образование
-        educations = get_claim_values(entity,
-                                      "P69")  # P69 = образовательное учреждение
+    year_str, month_str, day_str = match.groups()
+    year = int(year_str)
+    month = int(month_str)
+    day = int(day_str)
 
-        # Награды
-        awards = get_claim_values(entity, "P166")  # P166 = награда
+    # Определяем эру (до н. э. или н. э.)
+    era = "до н. э." if year < 1 else "н. э."
+    abs_year = abs(year)
+
+    # Форматируем в зависимости от точности
+    if precision == 9:  # Год
+        return f"{abs_year} {era}"
+    elif precision == 10:  # Месяц
+        if month == 0:
+            return f"{abs_year} {era}"
+        return f"{abs_year} {era}, месяц {month}"
+    elif precision == 11:  # День
+        if month == 0 or day == 0:
+            return f"{abs_year} {era}"
+        return f"{abs_year} {era}, {month}/{day}"
+    else:
+        return "Unsupported precision"
+
+
+def _prefixed(prefix):
+    return lambda value: prefix + value
+
+
+def _website_url(value):
+    if value.startswith(("http://", "https://")):
+        return value
+    return f"https://{value}"
+
+
+DEMOGRAPHIC = ("demographic",)
+GEOGRAPHICAL = ("geographical",)
+PROFESSIONAL = ("professional",)
+POLITICAL = ("political",)
+
+PROPERTY_SCHEMA = {
+    # Основная карточка
+    "P569": ClaimField("birth_date", TIME, "one", format_date),  # дата рождения
+    "P570": ClaimField("death_date", TIME, "one", format_date),  # дата смерти
+    "P106": ClaimField("occupations", ITEM, "many"),  # род деятельности
+    "P27": ClaimField("countries", ITEM, "many"),  # страна гражданства
+    "P856": ClaimField("official_websites", STRING, "any", _website_url),  # официальный сайт
+
+    # Социальные сети и другие идентификаторы
+    "P2002": ClaimField("twitter", STRING, "any", _prefixed("https://twitter.com/"), "social_media"),
+    "P2003": ClaimField("instagram", STRING, "any", _prefixed("https://instagram.com/"), "social_media"),
+    "P2013": ClaimField("facebook", STRING, "any", _prefixed("https://facebook.com/"), "social_media"),
+    "P2397": ClaimField("youtube", STRING, "any", _prefixed("https://youtube.com/channel/"), "social_media"),
+    "P345": ClaimField("imdb", STRING, "any", group="external_ids"),  # для актеров, режиссеров
+    "P214": ClaimField("viaf", STRING, "any", group="external_ids"),  # международный идентификатор
+    "P213": ClaimField("isni", STRING, "any", group="external_ids"),  # International Standard Name Identifier
+    "P496": ClaimField("orcid", STRING, "any", group="external_ids"),  # для ученых
+
+    # Разделы kb.more_info — загружаются по нажатию
+    "P21": ClaimField("gender", ITEM, "many", sections=DEMOGRAPHIC),  # пол
+    "P19": ClaimField("birth_place", ITEM, "many", sections=DEMOGRAPHIC + GEOGRAPHICAL),  # место рождения
+    "P20": ClaimField("death_place", ITEM, "many", sections=DEMOGRAPHIC + GEOGRAPHICAL),  # место смерти
+    "P172": ClaimField("ethnic_group", ITEM, "many", sections=DEMOGRAPHIC),  # этническая принадлежность
+    "P140": ClaimField("religion", ITEM, "many", sections=DEMOGRAPHIC),  # религия
+    "P40": ClaimField("children", ITEM, "many", sections=DEMOGRAPHIC),  # ребенок
+    "P1412": ClaimField("languages", ITEM, "many", sections=GEOGRAPHICAL),  # languages spoken, written or signed
+    "P69": ClaimField("educations", ITEM, "many", sections=PROFESSIONAL),  # образовательное учреждение
+    "P166": ClaimField("awards", ITEM, "many", sections=PROFESSIONAL),  # награда
+    "P800": ClaimField("notable_works", ITEM, "many", sections=PROFESSIONAL),  # notable work
+    "P39": ClaimField("positions", ITEM, "many", sections=PROFESSIONAL),  # должность
+    "P102": ClaimField("parties", ITEM, "many", sections=POLITICAL),  # член политической партии
+}
+
+# Свойства основной карточки (send_person_info)
+CARD_PROPERTIES = frozenset(
+    property_id for property_id, field in PROPERTY_SCHEMA.items()
+    if not field.sections)
+
+# Свойства разделов kb.more_info
+SECTION_PROPERTIES = {
+    section: frozenset(property_id
+                       for property_id, field in PROPERTY_SCHEMA.items()
+                       if section in field.sections)
+    for section in DEMOGRAPHIC + GEOGRAPHICAL + PROFESSIONAL + POLITICAL
+}
+
+# Порядок рангов утверждений; устаревшие (deprecated) не используются
+_RANK_ORDER = {"preferred": 0, "normal": 1}
+
+_session = None
+
+# Одновременные одинаковые запросы выполняются один раз
+_page_flight = SingleFlight()  # по нормализованному названию статьи
+_entity_flight = SingleFlight()  # по Q-id личности
+_label_flight = SingleFlight()  # по Q-id упомянутого элемента
+_section_flight = SingleFlight()  # по Q-id личности, разделу и языку
+
+
+async def open_session():
+    """Создаёт общую keep-alive сессию для всех запросов к Wikimedia."""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=config.HTTP_POOL_SIZE,
+            limit_per_host=config.HTTP_LIMIT_PER_HOST,
+            ttl_dns_cache=config.HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=config.HTTP_KEEPALIVE_TIMEOUT,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            headers={"User-Agent": config.USER_AGENT},
+        )
+    return _session
+
+
+async def close_session():
+    """Закрывает общую сессию и освобождает соединения пула."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+async def _get_json(url, params):
+    """GET-запрос через общую сессию и планировщик, возвращает JSON."""
+    return await scheduler.get_json(await open_session(), url, params)
+
+
+def normalize_title(name):
+    """Приводит название статьи к виду, в котором его хранит Википедия."""
+    title = " ".join(name.replace("_", " ").split())
+    return title[:1].upper() + title[1:]
+
+
+async def get_person_info(name):
+    """Получает расширенную информацию о личности из Википедии и Викиданных."""
+    page = await get_wikipedia_page(name)
+    if "error" in page:
+        return page
+
+    # Получаем детали из Викиданных
+    wikidata_data = await get_wikidata_info(page["wikidata_id"])
+    if wikidata_data.get("error") == WIKIDATA_TIMEOUT:
+        # Карточка по данным статьи; Викиданные догрузятся в кэш к следующему разу
+        return {**page, "partial": True}
+    if "error" in wikidata_data:
+        return wikidata_data
 
-        # Работы (для писателей, художников и т.д.)
-        notable_works = get_claim_values(entity, "P800")  # P800 = notable work
+    # Новый словарь, чтобы не менять запись в кэше
+    return {**page, **wikidata_data}
+
+
+async def stream_person_info(name):
+    """Отдаёт данные о личности по мере готовности парами (запись, последняя ли).
+
+    Сначала — данные статьи Википедии, затем — данные Викиданных
+    без названий связанных элементов, в конце — полная запись.
+    Если личность уже в кэше, полная запись отдаётся сразу и одна.
+    Запись с ключом "error" всегда последняя. Если Викиданные не успели
+    к сроку поиска, последняя — запись по данным статьи с ключом "partial".
+    """
+    page = await get_wikipedia_page(name)
+    if "error" in page:
+        yield page, True
+        return
+
+    wikidata_id = page["wikidata_id"]
+    wikidata_data = cache.get("person", keyed(wikidata_id))
+    if wikidata_data is None:
+        # Элемент загружается, пока отправляется карточка по статье:
+        # на yield генератор стоит, и без задачи запрос ждал бы отправки
+        entity_task = asyncio.ensure_future(get_wikidata_entity(wikidata_id))
+        try:
+            yield page, False
+        except GeneratorExit:
+            entity_task.cancel()
+            raise
+        try:
+            entity = await until_deadline(entity_task)
+            draft = {**page, **build_wikidata_info(entity, {})} if is_human(entity) else None
+        except asyncio.TimeoutError:
+            # Как в get_person_info: карточка по статье, не для кэша
+            backfill(get_wikidata_info(wikidata_id))
+            yield {**page, "partial": True}, True
+            return
+        except Exception as e:
+            yield {"error": f"Ошибка Викиданных: {str(e)}"}, True
+            return
+        if draft is None:
+            yield {"error": "Это не человек"}, True
+            return
+        yield draft, False
+
+        wikidata_data = await get_wikidata_info(wikidata_id, entity)
+        if "error" in wikidata_data:
+            yield wikidata_data, True
+            return
 
-        # Должности/позиции
-        positions = get_claim_values(entity, "P39")  # P39 = должность
+    yield {**page, **wikidata_data}, True
 
-        # Партии/организации
-        parties = get_claim_values(entity,
-                                   "P102")  # P102 = член политической партии
 
-        # Языки, на которых говорит человек
-        languages = get_claim_values(entity,
-                                     "P1412")  # P1412 = languages spoken, written or signed
+async def get_wikipedia_page(name):
+    """Находит статью Википедии и связанный с ней элемент Викиданных."""
+    page = _local_page(name)
+    if page is not None:
+        return page
 
-        # Пол (Q6581097 - мужской, Q6581072 - женский)
-        gender = get_claim_values(entity, "P21")  # P21 = пол
+    title = normalize_title(name)
+    try:
+        return await until_deadline(_page_flight.do(title, _load_wikipedia_page, title))
+    except asyncio.TimeoutError:
+        return {"error": WIKIPEDIA_TIMEOUT}
 
-        # Этническая принадлежность
-        ethnic_group = get_claim_values(entity,
-                                        "P172")  # P172 = этническая принадлежность
 
-        # Религия
-        religion = get_claim_values(entity, "P140")  # P140 = религия
+def _local_page(name):
+    """Данные статьи по локальному индексу (без текста статьи)."""
+    wikidata_id = local_index.find(name)
+    if wikidata_id is None:
+        return None
+    metrics.count("local_index_hits_total", kind="page")
+
+    entity = local_index.get_entity(wikidata_id)
+    sitelink = entity.get("sitelinks", {}).get("ruwiki")
+    title = sitelink["title"] if sitelink else entity_term(entity, "labels") or wikidata_id
+    images = entity.get("claims", {}).get("P18")
+    image_file = images[0]["mainsnak"]["datavalue"]["value"] if images else None
+
+    return {
+        "full_name": title,
+        "summary": "",
+        "image_url": (f"https://commons.wikimedia.org/wiki/Special:FilePath/"
+                      f"{quote(image_file.replace(' ', '_'))}?width=500"
+                      if image_file else None),
+        "page_url": (f"https://ru.wikipedia.org/wiki/{quote(title.replace(' ', '_'))}"
+                     if sitelink else ""),
+        "wikipedia_title": title,
+        "wikidata_id": wikidata_id,
+    }
 
-        # Дети
-        children = get_claim_values(entity, "P40")  # P40 = ребенок
 
-        # Сайты
-        official_websites = get_external_identifiers(entity,
-                                                     "P856")  # P856 = официальный сайт
+async def _load_wikipedia_page(name):
+    params = {
+        "action": "query",
+        "format": "json",
+        "titles": name,
+        "prop": "extracts|pageprops|pageimages|info",
+        "exintro": 1,
+        "explaintext": 1,
+        "ppprop": "wikibase_item|disambiguation",
+        "pithumbsize": 500,
+        "piprop": "thumbnail|name",
+        "redirects": 1,
+        "inprop": "url",
+    }
 
-        # Социальные сети и другие идентификаторы
-        twitter = get_external_identifiers(entity, "P2002")
-        instagram = get_external_identifiers(entity, "P2003")
-        facebook = get_external_identifiers(entity, "P2013")
-        youtube = get_external_identifiers(entity, "P2397")
+    try:
+        with metrics.span("wikipedia_query"):
+            data = await _get_json(WIKIPEDIA_API_URL, params)
+        return _page_record(next(iter(data["query"]["pages"].values())))
+    except Exception as e:
+        return {"error": f"Ошибка запроса: {str(e)}"}
 
-        # IMDB ID (для актеров, режиссеров)
-        imdb_id = get_external_identifiers(entity, "P345")
 
-        # VIAF ID (международный идентификатор)
-        viaf_id = get_external_identifiers(entity, "P214")
+def _page_record(page):
+    """Запись get_wikipedia_page по странице из ответа action=query."""
+    if "missing" in page or "invalid" in page:
+        return {"error": PAGE_NOT_FOUND}
 
-        # ISNI (International Standard Name Identifier)
-        isni = get_external_identifiers(entity, "P213")
+    # Проверка на disambiguation page
+    if page.get("pageprops", {}).get("disambiguation"):
+        return {"error": "Это страница неоднозначности, уточните запрос"}
 
-        # ORCID (для ученых)
-        orcid = get_external_identifiers(entity, "P496")
+    wikidata_id = page.get("pageprops", {}).get("wikibase_item")
+    image_url = page.get("thumbnail", {}).get("source", "")
+    page_url = page.get("fullurl", "")
 
+    if not wikidata_id:
         return {
-            "full_name": name,
-            "aliases": aliases,
-            "description": description,
-            "birth_date": birth_date,
-            "death_date": death_date,
-            "birth_place": birth_place,
-            "death_place": death_place,
-            "occupations": occupations,
-            "countries": countries,
-            "educations": educations,
-            "awards": awards,
-            "notable_works": notable_works,
-            "positions": positions,
-            "parties": parties,
-            "languages": languages,
-            "gender": gender,
-            "ethnic_group": ethnic_group,
-            "religion": religion,
-            "children": children,
-            "official_websites": official_websites,
-            "social_media": {
-                "twitter": twitter,
-                "instagram": instagram,
-                "facebook": facebook,
-                "youtube": youtube,
-            },
-            "external_ids": {
-                "imdb": imdb_id,
-                "viaf": viaf_id,
-                "isni": isni,
-                "orcid": orcid,
-            },
-            "wikidata_id": wikidata_id,
-            "wikidata_url": f"https://www.wikidata.org/wiki/{wikidata_id}",
+            "full_name": page["title"],
+            "summary": page.get("extract", ""),
+            "image_url": unquote(image_url) if image_url else None,
+            "page_url": page_url,
+            "error": "Нет данных из Викиданных",
         }
-    except Exception as e:
-        return {"error": f"Ошибка Викиданных: {str(e)}"}
 
+    return {
+        "full_name": page["title"],
+        "summary": page.get("extract", ""),
+        "image_url": unquote(image_url) if image_url else None,
+        "page_url": page_url,
+        "wikipedia_title": page["title"],
+        "wikidata_id": wikidata_id,
+    }
 
-def get_claim_value(entity, property_id):
-    """Извлекает значение конкретного свойства."""
-    claims = entity.get("claims", {}).get(property_id, [])
-    if claims and "datavalue" in claims[0]["mainsnak"]:
-        return claims[0]["mainsnak"]["datavalue"]["value"]
-    return None
 
+async def get_wikipedia_pages(names):
+    """Пакетный get_wikipedia_page: имя -> запись, до 50 названий в запросе.
+
+    Текст статьи (summary) в пакетном режиме не загружается: TextExtracts
+    отдаёт вступления не больше чем для 20 страниц за запрос.
+    """
+    pages = {}
+    titles = {}  # нормализованное название -> имена из запроса
+    for name in dict.fromkeys(names):
+        page = _local_page(name)
+        if page is not None:
+            pages[name] = page
+        else:
+            titles.setdefault(normalize_title(name), []).append(name)
+
+    chunks = [list(titles)[i:i + WBGETENTITIES_LIMIT]
+              for i in range(0, len(titles), WBGETENTITIES_LIMIT)]
+    for found in await asyncio.gather(*(_fetch_pages(chunk) for chunk in chunks)):
+        for title, page in found.items():
+            for name in titles[title]:
+                pages[name] = page
+    return pages
+
+
+async def _fetch_pages(titles):
+    """Один запрос action=query не более чем за 50 названиями."""
+    params = {
+        "action": "query",
+        "format": "json",
+        "titles": "|".join(titles),
+        "prop": "pageprops|pageimages|info",
+        "ppprop": "wikibase_item|disambiguation",
+        "pithumbsize": 500,
+        "piprop": "thumbnail|name",
+        "pilimit": WBGETENTITIES_LIMIT,
+        "redirects": 1,
+        "inprop": "url",
+    }
 
-def get_claim_values(entity, property_id):
-    """Извлекает список значений свойства."""
-    values = []
-    claims = entity.get("claims", {}).get(property_id, [])
+    try:
+        with metrics.span("wikipedia_query_batch"):
+            data = await _get_json(WIKIPEDIA_API_URL, params)
+    except Exception as e:
+        return {title: {"error": f"Ошибка запроса: {str(e)}"} for title in titles}
+
+    query = data.get("query", {})
+    # Запрошенное название -> нормализованное -> цель перенаправления
+    renamed = {item["from"]: item["to"]
+               for item in query.get("normalized", []) + query.get("redirects", [])}
+    by_title = {page["title"]: page for page in query.get("pages", {}).values()}
+
+    found = {}
+    for title in titles:
+        target = renamed.get(title, title)
+        target = renamed.get(target, target)
+        page = by_title.get(target)
+        found[title] = (_page_record(page) if page is not None
+                        else {"error": PAGE_NOT_FOUND})
+    return found
+
+
+async def search_titles(prefix, limit=10, fuzzy=False):
+    """Статьи, названия которых начинаются с prefix, по убыванию популярности.
+
+    Один запрос generator=prefixsearch сразу отдаёт описание, Q-id
+    и миниатюру; страницы неоднозначности пропускаются. fuzzy — поиск
+    с учётом опечаток (для «возможно, вы имели в виду»).
+    Возвращает пару (статьи, полон ли ответ): ответ полон, если у API
+    нет продолжения, то есть других статей с таким префиксом нет.
+    """
+    params = {
+        "action": "query",
+        "format": "json",
+        "generator": "prefixsearch",
+        "gpssearch": prefix,
+        "gpslimit": limit,
+        "gpsnamespace": 0,
+        "prop": "pageprops|description|pageimages",
+        "ppprop": "wikibase_item|disambiguation",
+        "piprop": "thumbnail",
+        "pithumbsize": 100,
+        "pilimit": limit,
+        "redirects": 1,
+    }
+    if fuzzy:
+        params["gpsprofile"] = "fuzzy"
+
+    with metrics.span("prefixsearch"):
+        data = await _get_json(WIKIPEDIA_API_URL, params)
+    pages = sorted(data.get("query", {}).get("pages", {}).values(),
+                   key=lambda page: page.get("index", 0))
+    results = [{
+        "title": page["title"],
+        "description": page.get("description", ""),
+        "wikidata_id": page.get("pageprops", {}).get("wikibase_item"),
+        "image_url": page.get("thumbnail", {}).get("source"),
+    } for page in pages if "disambiguation" not in page.get("pageprops", {})]
+    return results, "continue" not in data
+
+
+async def get_wikidata_info(wikidata_id, entity=None):
+    """Извлекает расширенные структурированные данные из Викиданных.
+
+    Если элемент уже загружен (entity), повторный запрос не делается.
+    Значения, названия которых не успели к сроку поиска, пропускаются;
+    такая запись помечается ключом "partial" и не кэшируется, а полная
+    собирается в фоне.
+    """
+    cached = cache.get("person", keyed(wikidata_id))
+    if cached is not None:
+        return cached
 
-    for claim in claims:
-        if "datavalue" not in claim["mainsnak"]:
-            continue
+    try:
+        if entity is None:
+            entity = await until_deadline(get_wikidata_entity(wikidata_id))
 
-        datavalue = claim["mainsnak"]["datavalue"]
-        if datavalue["type"] == "wikibase-entityid":
-            item_id = datavalue["value"]["id"]
-            label = get_wikidata_label(item_id)
-            if label:
-                values.append(label)
-        elif datavalue["type"] == "time":
-            values.append(format_date(datavalue["value"]["time"]))
-        elif datavalue["type"] == "string":
-            values.append(datavalue["value"])
-        elif datavalue["type"] == "monolingualtext":
-            values.append(datavalue["value"]["text"])
-
-    return values
-
-
-def get_external_identifiers(entity, property_id):
-    """Получает внешние идентификаторы (соцсети, IMDB и т.д.)."""
-    claims = entity.get("claims", {}).get(property_id, [])
-    if not claims:
-        return None
+        if not is_human(entity):
+            return {"error": "Это не человек"}
 
-    values = []
-    for claim in claims:
-        if "datavalue" in claim["mainsnak"]:
-            if claim["mainsnak"]["datavalue"]["type"] == "string":
-                value = claim["mainsnak"]["datavalue"]["value"]
-                # Форматируем URL для некоторых свойств
-                if property_id == "P2002":  # Twitter
-                    value = f"https://twitter.com/{value}"
-                elif property_id == "P2003":  # Instagram
-                    value = f"https://instagram.com/{value}"
-                elif property_id == "P2013":  # Facebook
-                    value = f"https://facebook.com/{value}"
-                elif property_id == "P2397":  # YouTube
-                    value = f"https://youtube.com/channel/{value}"
-                elif property_id == "P856":  # Официальный сайт
-                    if not value.startswith(("http://", "https://")):
-                        value = f"https://{value}"
-                values.append(value)
+        # Названия элементов, нужных для карточки, — одним пакетом
+        item_ids = collect_item_ids(entity.get("claims", {}), CARD_PROPERTIES)
+        labels = await get_wikidata_labels(item_ids)
+        info = build_wikidata_info(entity, labels)
+    except asyncio.TimeoutError:
+        backfill(get_wikidata_info(wikidata_id))
+        return {"error": WIKIDATA_TIMEOUT}
+    except Exception as e:
+        return {"error": f"Ошибка Викиданных: {str(e)}"}
+
+    if len(labels) < len(item_ids):
+        if has_deadline():
+            backfill(get_wikidata_info(wikidata_id, entity))
+        return {**info, "partial": True}
+    cache.set("person", keyed(wikidata_id), info)
+    return info
+
+
+async def get_people_info(names):
+    """Пакетный get_person_info: имя -> запись (или запись с ключом "error").
+
+    Число запросов растёт с числом пачек по 50, а не с числом имён:
+    статьи, элементы и названия загружаются пакетами на весь список.
+    """
+    pages = await get_wikipedia_pages(names)
+    people = await get_wikidata_infos(
+        [page["wikidata_id"] for page in pages.values() if "error" not in page])
+
+    results = {}
+    for name in names:
+        page = pages[name]
+        if "error" in page:
+            results[name] = page
+            continue
+        wikidata_data = people[page["wikidata_id"]]
+        results[name] = wikidata_data if "error" in wikidata_data else {**page, **wikidata_data}
+    return results
 
-    return values[0] if len(values) == 1 else values if values else None
 
+async def get_wikidata_infos(wikidata_ids):
+    """Пакетный get_wikidata_info: названия для всех карточек — одним набором пачек.
 
-def get_wikidata_label(item_id):
-    """Получает название элемента Викиданных на русском."""
-    url = "https://www.wikidata.org/w/api.php"
+    Записи, для которых не получены все названия, помечаются ключом
+    "partial" и не кэшируются.
+    """
+    keys = {wikidata_id: keyed(wikidata_id) for wikidata_id in wikidata_ids}
+    cached = cache.get_many("person", list(keys.values()))
+    infos = {wikidata_id: cached[key] for wikidata_id, key in keys.items() if key in cached}
+    missing = [wikidata_id for wikidata_id in keys if wikidata_id not in infos]
+    if not missing:
+        return infos
+
+    try:
+        entities = await get_wikidata_entities(missing)
+        humans = {wikidata_id: entity for wikidata_id, entity in entities.items()
+                  if "missing" not in entity and is_human(entity)}
+        labels = await get_wikidata_labels(
+            [item_id for entity in humans.values()
+             for item_id in collect_item_ids(entity.get("claims", {}), CARD_PROPERTIES)])
+    except Exception as e:
+        infos.update((wikidata_id, {"error": f"Ошибка Викиданных: {str(e)}"})
+                     for wikidata_id in missing)
+        return infos
+
+    built = {}
+    complete = {}
+    for wikidata_id, entity in humans.items():
+        info = build_wikidata_info(entity, labels)
+        # Как в get_wikidata_info: без части названий запись неполна и не кэшируется
+        if all(item_id in labels for item_id in
+               collect_item_ids(entity.get("claims", {}), CARD_PROPERTIES)):
+            complete[keys[wikidata_id]] = info
+        else:
+            info = {**info, "partial": True}
+        built[wikidata_id] = info
+    cache.set_many("person", complete)
+    for wikidata_id in missing:
+        infos[wikidata_id] = built.get(wikidata_id) or {"error": "Это не человек"}
+    return infos
+
+
+async def get_wikidata_entity(wikidata_id):
+    """Загружает элемент Викиданных целиком (из локального индекса или API)."""
+    entity = local_index.get_entity(wikidata_id)
+    if entity is not None:
+        metrics.count("local_index_hits_total", kind="entity")
+        return entity
+    return await _entity_flight.do(wikidata_id, _fetch_entity, wikidata_id)
+
+
+async def get_wikidata_entities(wikidata_ids):
+    """Пакетный get_wikidata_entity: Q-id -> элемент, по 50 в запросе."""
+    entities = {}
+    missing = []
+    for wikidata_id in dict.fromkeys(wikidata_ids):
+        entity = local_index.get_entity(wikidata_id)
+        if entity is not None:
+            metrics.count("local_index_hits_total", kind="entity")
+            entities[wikidata_id] = entity
+        else:
+            missing.append(wikidata_id)
+
+    chunks = [missing[i:i + WBGETENTITIES_LIMIT]
+              for i in range(0, len(missing), WBGETENTITIES_LIMIT)]
+    for found in await asyncio.gather(*(_fetch_entities(chunk) for chunk in chunks)):
+        entities.update(found)
+    return entities
+
+
+async def _fetch_entity(wikidata_id):
+    return (await _fetch_entities([wikidata_id]))[wikidata_id]
+
+
+async def _fetch_entities(wikidata_ids):
     params = {
         "action": "wbgetentities",
-        "ids": item_id,
-        "props": "labels",
-        "languages": "ru",
         "format": "json",
+        "ids": "|".join(wikidata_ids),
+        "props": "labels|claims|descriptions|aliases|sitelinks",
+        "languages": "|".join(LANGUAGES),
+    }
+    with metrics.span("wikidata_entity"):
+        data = await _get_json(WIKIDATA_API_URL, params)
+    return data["entities"]
+
+
+def is_human(entity):
+    """Проверка, что элемент — человек (P31 = Q5)."""
+    instance_of = [claim["mainsnak"]["datavalue"]["value"]["id"]
+                   for claim in entity.get("claims", {}).get("P31", [])
+                   if "datavalue" in claim["mainsnak"]]
+    return "Q5" in instance_of
+
+
+def entity_term(entity, kind):
+    """Название (labels) или описание (descriptions) элемента по цепочке языков."""
+    return pick({code: term["value"] for code, term in entity.get(kind, {}).items()})
+
+
+def build_wikidata_info(entity, labels):
+    """Собирает данные карточки из элемента и словаря названий."""
+    wikidata_id = entity["id"]
+
+    # Основные данные: название, описание и псевдонимы — по цепочке языков
+    sitelink = entity.get("sitelinks", {}).get("ruwiki")
+    name = (entity_term(entity, "labels")
+            or (sitelink["title"] if sitelink else wikidata_id))
+    description = entity_term(entity, "descriptions") or ""
+    aliases = [alias["value"] for alias in pick(entity.get("aliases", {})) or []]
+
+    # Даты, профессии, страны, сайты и идентификаторы — за один проход
+    claims = entity.get("claims", {})
+    card = extract_claims(claims, labels, CARD_PROPERTIES)
+
+    # Утверждения для разделов сохраняются (только значения и ранги),
+    # их названия запрашиваются при открытии раздела (load_section)
+    section_claims = {
+        property_id: [{"mainsnak": {"datavalue": claim["mainsnak"]["datavalue"]},
+                       "rank": claim.get("rank", "normal")}
+                      for claim in claims[property_id]
+                      if "datavalue" in claim["mainsnak"]
+                      and claim.get("rank") != "deprecated"]
+        for property_id in claims
+        if property_id in PROPERTY_SCHEMA and PROPERTY_SCHEMA[property_id].sections
     }
 
-    try:
-        response = requests.get(url, params=params)
-        data = response.json()
-        return data["entities"][item_id]["labels"]["ru"]["value"]
-    except:
-        return None
+    return {
+        "full_name": name,
+        "aliases": aliases,
+        "description": description,
+        **card,
+        "wikidata_id": wikidata_id,
+        "wikidata_url": f"https://www.wikidata.org/wiki/{wikidata_id}",
+        "claims": section_claims,
+        "loaded_sections": [],
+        # Статья нужна, чтобы по элементу найти её миниатюру (prefetch фото)
+        **({"wikipedia_title": sitelink["title"]} if sitelink else {}),
+    }
 
 
-def format_date(date_info):
-    time_str = date_info['time']
-    precision = date_info['precision']
+@dataclass(frozen=True, slots=True)
+class Person:
+    """Компактная неизменяемая запись о личности.
+
+    Хранится в общем хранилище (save_person/get_person), а в состоянии
+    FSM пользователя остаётся только её ключ — Q-id.
+    """
+    wikidata_id: str
+    full_name: str
+    description: str = ""
+    aliases: tuple = ()
+    birth_date: str = None
+    death_date: str = None
+    occupations: tuple = ()
+    countries: tuple = ()
+    official_websites: object = None  # строка, кортеж строк или None
+    social_media: dict = None
+    external_ids: dict = None
+    summary: str = ""
+    image_url: str = None
+    page_url: str = ""
+    wikipedia_title: str = ""
+    claims: dict = None  # утверждения ещё не загруженных разделов
+    loaded_sections: tuple = ()
+    # Поля разделов kb.more_info
+    gender: tuple = ()
+    birth_place: tuple = ()
+    death_place: tuple = ()
+    ethnic_group: tuple = ()
+    religion: tuple = ()
+    children: tuple = ()
+    languages: tuple = ()
+    educations: tuple = ()
+    awards: tuple = ()
+    notable_works: tuple = ()
+    positions: tuple = ()
+    parties: tuple = ()
+
+    @property
+    def wikidata_url(self):
+        return f"https://www.wikidata.org/wiki/{self.wikidata_id}"
+
+    @classmethod
+    def from_info(cls, info):
+        """Запись из словаря, который возвращают функции этого модуля."""
+        return cls(**{name: _freeze(info[name])
+                      for name in _PERSON_FIELDS if name in info})
+
+    def to_tuple(self):
+        """Упаковка в кортеж значений без имён полей."""
+        return tuple(getattr(self, name) for name in _PERSON_FIELDS)
+
+    @classmethod
+    def from_tuple(cls, values):
+        return cls(*map(_freeze, values))
+
+
+_PERSON_FIELDS = tuple(field.name for field in fields(Person))
+
+
+def _freeze(value):
+    return tuple(value) if isinstance(value, list) else value
+
+
+def save_person(person):
+    """Кладёт запись в общее хранилище и возвращает её ключ."""
+    cache.set("record", keyed(person.wikidata_id), person.to_tuple())
+    return person.wikidata_id
+
+
+async def get_person(handle):
+    """Достаёт запись из хранилища по ключу.
+
+    Если запись уже вытеснена, она собирается заново по Q-id из Викиданных
+    (без данных статьи Википедии — для разделов они не нужны).
+    """
+    if not handle:
+        return None
+    values = cache.get("record", keyed(handle))
+    # Запись без утверждений сохранена по одной статье, когда Викиданные не успели
+    if values is not None and values[_PERSON_FIELDS.index("claims")] is not None:
+        return Person.from_tuple(values)
 
-    # Проверяем, поддерживается ли точность (например, год, месяц, день)
-    if precision not in [9, 10, 11]:
-        return "Unsupported precision"
+    info = await get_wikidata_info(handle)
+    if "error" in info:
+        return None
+    person = Person.from_info(info)
+    save_person(person)
+    return person
+
+
+async def load_section(person, section):
+    """Догружает свойства раздела kb.more_info.
+
+    Возвращает новую запись с заполненными полями раздела и сохраняет её
+    в хранилище, чтобы раздел не загружался повторно. Если не все названия
+    удалось получить, раздел не считается загруженным: запись с тем, что
+    есть, возвращается, но не сохраняется, и утверждения остаются в ней.
+    """
+    if section in person.loaded_sections:
+        return person
+
+    # Названия выбираются на языке вызвавшего: у разных языков разные загрузки
+    values, complete = await _section_flight.do((person.wikidata_id, section, language()),
+                                                _load_section, person.claims, section)
+    if not complete:
+        return replace(person, **{name: _freeze(value) for name, value in values.items()})
+    loaded = person.loaded_sections + (section,)
+    # Утверждения, нужные только загруженным разделам, больше не хранятся
+    claims = {property_id: claims
+              for property_id, claims in (person.claims or {}).items()
+              if set(PROPERTY_SCHEMA[property_id].sections) - set(loaded)}
+    person = replace(person, claims=claims, loaded_sections=loaded,
+                     **{name: _freeze(value) for name, value in values.items()})
+    save_person(person)
+    return person
+
+
+async def _load_section(claims, section):
+    property_ids = SECTION_PROPERTIES[section]
+    claims = claims or {}
+    with metrics.span("section"):
+        item_ids = collect_item_ids(claims, property_ids)
+        labels = await get_wikidata_labels(item_ids)
+        return extract_claims(claims, labels, property_ids), len(labels) == len(item_ids)
+
+
+def extract_claims(claims, labels, property_ids):
+    """Один проход по утверждениям: поля записи для указанных свойств.
+
+    Значения-элементы заменяются названиями из labels.
+    """
+    record = _empty_record(property_ids)
+    for property_id, property_claims in claims.items():
+        if property_id not in property_ids:
+            continue
+        field = PROPERTY_SCHEMA[property_id]
+
+        values = []
+        for claim in _by_rank(property_claims):
+            datavalue = claim["mainsnak"].get("datavalue")
+            if not datavalue or datavalue["type"] != field.value_type:
+                continue
+            value = datavalue["value"]
+            if field.value_type == ITEM:
+                value = labels.get(value["id"])
+            if value and field.format:
+                value = field.format(value)
+            if value:
+                values.append(value)
+                if field.cardinality == "one":
+                    break
+
+        if field.cardinality == "one":
+            value = values[0] if values else None
+        elif field.cardinality == "any":
+            value = values[0] if len(values) == 1 else values or None
+        else:
+            value = values
+        target = record[field.group] if field.group else record
+        target[field.name] = value
+
+    return record
+
+
+def _empty_record(property_ids):
+    """Запись со значениями по умолчанию для отсутствующих свойств."""
+    record = {}
+    for property_id in property_ids:
+        field = PROPERTY_SCHEMA[property_id]
+        target = record.setdefault(field.group, {}) if field.group else record
+        target[field.name] = [] if field.cardinality == "many" else None
+    return record
+
+
+def _by_rank(claims):
+    """Утверждения без устаревших, предпочтительные — первыми."""
+    ranked = [claim for claim in claims if claim.get("rank") != "deprecated"]
+    ranked.sort(key=lambda claim: _RANK_ORDER.get(claim.get("rank"), 1))
+    return ranked
+
+
+def collect_item_ids(claims, property_ids):
+    """Собирает Q-id элементов, на которые ссылаются указанные свойства."""
+    item_ids = {}
+    for property_id in property_ids:
+        for claim in claims.get(property_id, []):
+            datavalue = claim["mainsnak"].get("datavalue")
+            if claim.get("rank") == "deprecated":
+                continue
+            if datavalue and datavalue["type"] == ITEM:
+                item_ids[datavalue["value"]["id"]] = None
+    return list(item_ids)
+
+
+async def get_wikidata_labels(item_ids):
+    """Получает названия элементов на текущем языке (или по цепочке LANGUAGES).
+
+    Сначала из кэша и локального индекса, остальные — пачками по 50.
+    В кэше хранятся названия на всех языках цепочки. Названия, не
+    успевшие к сроку поиска, в результат не попадают (их загрузка
+    продолжается, и они сохранятся в кэш).
+    """
+    item_ids = list(dict.fromkeys(item_ids))
+    labels = cache.get_many("label", item_ids)
+    missing = [item_id for item_id in item_ids if item_id not in labels]
+    if missing and local_index.enabled:
+        found = local_index.get_labels(missing)
+        metrics.count("local_index_hits_total", len(found), kind="label")
+        labels.update(found)
+        missing = [item_id for item_id in missing if item_id not in labels]
+    if missing:
+        try:
+            labels.update(await until_deadline(_label_flight.do_many(missing, _load_labels)))
+        except asyncio.TimeoutError:
+            metrics.count("labels_late_total", len(missing))
+    return {item_id: pick(values) or "" for item_id, values in labels.items()}
+
+
+async def _load_labels(item_ids):
+    """Запрашивает названия параллельными пачками и сохраняет их в кэш."""
+    chunks = [item_ids[i:i + WBGETENTITIES_LIMIT]
+              for i in range(0, len(item_ids), WBGETENTITIES_LIMIT)]
+
+    labels = {}
+    metrics.count("labels_requested_total", len(item_ids))
+    with metrics.span("label_fanout"):
+        results = await asyncio.gather(*(_fetch_labels(chunk) for chunk in chunks))
+    for chunk_labels in results:
+        labels.update(chunk_labels)
+        cache.set_many("label", chunk_labels)
+    return labels
+
+
+async def _fetch_labels(item_ids):
+    """Один запрос wbgetentities за названиями не более чем 50 элементов."""
+    params = {
+        "action": "wbgetentities",
+        "ids": "|".join(item_ids),
+        "props": "labels",
+        "languages": "|".join(LANGUAGES),
+        "format": "json",
+    }
 
-    # Разбираем строку времени
-    match = re.match(r'([+-]?\d+)-(\d+)-(\d+)T.*', time_str)
-    if not match:
-        return "Invalid time format"
+    try:
+        with metrics.span("wikidata_labels"):
+            data = await _get_json(WIKIDATA_API_URL, params)
+    except Exception:
+        return {}
 
-    year_str, month_str, day_str = match.groups()
-    year = int(year_str)
-    month = int(month_str)
-    day = int(day_str)
+    # Названия на всех языках цепочки; элементы без них запоминаются
+    # пустым словарём, чтобы не запрашивать их повторно
+    return {item_id: {code: label["value"]
+                      for code, label in item.get("labels", {}).items()}
+            for item_id, item in data.get("entities", {}).items()}
 
-    # Определяем эру (до н. э. или н. э.)
-    era = "до н. э." if year < 1 else "н. э."
-    abs_year = abs(year)
 
-    # Форматируем в зависимости от точности
-    if precision == 9:  # Год
-        return f"{abs_year} {era}"
-    elif precision == 10:  # Месяц
-        if month == 0:
-            return f"{abs_year} {era}"
-        return f"{abs_year} {era}, месяц {month}"
-    elif precision == 11:  # День
-        if month == 0 or day == 0:
-            return f"{abs_year} {era}"
-        return f"{abs_year} {era}, {month}/{day}"
-    else:
-        return "Unsupported precision"
\ No newline at end of file
+async def get_wikidata_label(item_id):
+    """Получает название элемента Викиданных на текущем языке."""
+    return (await get_wikidata_labels([item_id])).get(item_id)
@@ -0,0 +1,66 @@
+"""Пакетный поиск (/batch): разбор списка имён и выгрузка результатов."""
+import csv
+import io
+import json
+
+# Колонки выгрузки: ключ записи get_person_info -> заголовок
+COLUMNS = {
+    "query": "Запрос",
+    "full_name": "Имя",
+    "birth_date": "Дата рождения",
+    "death_date": "Дата смерти",
+    "occupations": "Род деятельности",
+    "countries": "Страны",
+    "description": "Описание",
+    "wikidata_id": "Викиданные",
+    "page_url": "Статья",
+    "error": "Ошибка",
+}
+
+FORMATS = ("csv", "json")
+
+
+def parse_names(text, is_csv=False):
+    """Имена по одному в строке; из CSV-файла берётся первая колонка.
+
+    Запятая в обычном тексте — часть имени («Пушкин, Александр Сергеевич»).
+    Пустые строки и повторы отбрасываются, порядок сохраняется.
+    """
+    if is_csv:
+        lines = [row[0] for row in csv.reader(io.StringIO(text)) if row]
+    else:
+        lines = text.splitlines()
+    names = {}
+    for line in lines:
+        name = " ".join(line.split())
+        if name:
+            names[name] = None
+    return list(names)
+
+
+def make_rows(names, results):
+    """Строки выгрузки в порядке запроса."""
+    rows = []
+    for name in names:
+        info = results.get(name, {})
+        row = {"query": name}
+        for key in COLUMNS:
+            if key != "query":
+                value = info.get(key)
+                row[key] = ", ".join(value) if isinstance(value, (list, tuple)) else value or ""
+        rows.append(row)
+    return rows
+
+
+def to_csv(rows):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(COLUMNS.values())
+    for row in rows:
+        writer.writerow(row[key] for key in COLUMNS)
+    # BOM — чтобы Excel открыл UTF-8 без вопросов
+    return output.getvalue().encode("utf-8-sig")
+
+
+def to_json(rows):
+    return json.dumps(rows, ensure_ascii=False, indent=1).encode("utf-8")
@@ -0,0 +1,191 @@
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+
+from app import config
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Cache:
+    """Двухуровневый кэш: LRU в памяти процесса поверх файла SQLite.
+
+    Записи разделены по видам (kind): у каждого вида свой TTL.
+    Память ограничена числом записей, диск — числом строк на вид;
+    при переполнении вытесняются давно не использованные записи.
+    """
+
+    def __init__(self, path, memory_size, max_rows, ttls):
+        self.path = path
+        self.memory_size = memory_size
+        self.max_rows = max_rows
+        self.ttls = ttls
+        self._memory = OrderedDict()  # (kind, key) -> (expires_at, value)
+        self._db = None
+        self._writes = 0
+        self.hits = {}
+        self.misses = {}
+
+    def open(self):
+        """Открывает файл кэша и прогревает память последними записями."""
+        if self._db is not None:
+            return
+        self._db = sqlite3.connect(self.path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " kind TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (kind, key))")
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS cache_lru ON cache (kind, accessed_at)")
+        self._db.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+        self._db.commit()
+
+        rows = self._db.execute(
+            "SELECT kind, key, value, expires_at FROM cache"
+            " ORDER BY accessed_at DESC LIMIT ?", (self.memory_size,))
+        for kind, key, value, expires_at in reversed(rows.fetchall()):
+            self._memory[(kind, key)] = (expires_at, json.loads(value))
+        logger.info("Кэш открыт: %s, в памяти %d записей",
+                    self.path, len(self._memory))
+
+    def close(self):
+        if self._db is not None:
+            self._db.commit()
+            self._db.close()
+            self._db = None
+        logger.info("Статистика кэша: %s", self.stats())
+
+    def get(self, kind, key):
+        """Возвращает значение или None, если записи нет или она устарела."""
+        return self.get_many(kind, [key]).get(key)
+
+    def get_many(self, kind, keys):
+        """Возвращает словарь найденных значений для списка ключей."""
+        now = time.time()
+        found = {}
+        missing = []
+        for key in keys:
+            entry = self._memory.get((kind, key))
+            if entry and entry[0] > now:
+                self._memory.move_to_end((kind, key))
+                found[key] = entry[1]
+            else:
+                missing.append(key)
+
+        if missing and self._db is not None:
+            for key, value, expires_at in self._select(kind, missing, now):
+                value = json.loads(value)
+                self._remember(kind, key, expires_at, value)
+                found[key] = value
+
+        self._count(self.hits, kind, len(found))
+        self._count(self.misses, kind, len(keys) - len(found))
+        return found
+
+    def set(self, kind, key, value):
+        self.set_many(kind, {key: value})
+
+    def set_many(self, kind, items):
+        """Сохраняет пары ключ-значение с TTL, заданным для вида."""
+        if not items:
+            return
+        now = time.time()
+        expires_at = now + self.ttls[kind]
+        for key, value in items.items():
+            self._remember(kind, key, expires_at, value)
+
+        if self._db is None:
+            return
+        self._db.executemany(
+            "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+            [(kind, key, json.dumps(value, ensure_ascii=False), expires_at, now)
+             for key, value in items.items()])
+        self._db.commit()
+
+        self._writes += len(items)
+        if self._writes >= 1000:
+            self._writes = 0
+            self._evict()
+
+    def clear(self):
+        """Удаляет все записи и обнуляет счётчики."""
+        self._memory.clear()
+        self.hits.clear()
+        self.misses.clear()
+        if self._db is not None:
+            self._db.execute("DELETE FROM cache")
+            self._db.commit()
+
+    def stats(self):
+        """Счётчики попаданий и промахов по видам записей."""
+        return {kind: {"hits": self.hits.get(kind, 0),
+                       "misses": self.misses.get(kind, 0)}
+                for kind in self.ttls}
+
+    def _select(self, kind, keys, now):
+        rows = []
+        # SQLite ограничивает число параметров в одном запросе
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows += self._db.execute(
+                f"SELECT key, value, expires_at FROM cache"
+                f" WHERE kind = ? AND expires_at > ? AND key IN ({placeholders})",
+                (kind, now, *chunk)).fetchall()
+        if rows:
+            self._db.executemany(
+                "UPDATE cache SET accessed_at = ? WHERE kind = ? AND key = ?",
+                [(now, kind, key) for key, _, _ in rows])
+            self._db.commit()
+        return rows
+
+    def _remember(self, kind, key, expires_at, value):
+        self._memory[(kind, key)] = (expires_at, value)
+        self._memory.move_to_end((kind, key))
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _evict(self):
+        """Удаляет устаревшие строки и самые старые сверх лимита."""
+        self._db.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+        for kind in self.ttls:
+            self._db.execute(
+                "DELETE FROM cache WHERE kind = ? AND key IN ("
+                " SELECT key FROM cache WHERE kind = ?"
+                " ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (kind, kind, self.max_rows))
+        self._db.commit()
+
+    @staticmethod
+    def _count(counter, kind, n):
+        if n:
+            counter[kind] = counter.get(kind, 0) + n
+
+
+cache = Cache(
+    path=config.CACHE_PATH,
+    memory_size=config.CACHE_MEMORY_SIZE,
+    max_rows=config.CACHE_MAX_ROWS,
+    ttls={
+        "label": config.CACHE_LABEL_TTL,
+        "person": config.CACHE_PERSON_TTL,
+        "record": config.CACHE_PERSON_TTL,
+        "render": config.CACHE_PERSON_TTL,
+        "photo": config.CACHE_PHOTO_TTL,
+    },
+)
+
+
+def _cache_samples():
+    return [(f"cache_{result}_total", {"kind": kind}, value)
+            for kind, counts in cache.stats().items()
+            for result, value in counts.items()]
+
+
+metrics.add_collector(_cache_samples)
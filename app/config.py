@@ -0,0 +1,103 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# HTTP-клиент для запросов к Wikimedia
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 100))  # всего соединений в пуле
+HTTP_LIMIT_PER_HOST = int(os.getenv('HTTP_LIMIT_PER_HOST', 20))  # соединений на один хост
+HTTP_DNS_CACHE_TTL = int(os.getenv('HTTP_DNS_CACHE_TTL', 300))  # секунд
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', 30))  # секунд
+USER_AGENT = os.getenv('USER_AGENT', 'HistoriographerBot/1.0 (Telegram bot)')
+
+# Языки названий, описаний и псевдонимов из Викиданных: первый — основной,
+# остальные — по порядку, если на основном значения нет (mul — общее для всех языков)
+LANGUAGES = [code.strip() for code in os.getenv('LANGUAGES', 'ru,uk,en,mul').split(',') if code.strip()]
+
+# Адреса API; для тестов и бенчмарков их можно направить на локальный сервер
+WIKIPEDIA_API_URL = os.getenv('WIKIPEDIA_API_URL', 'https://ru.wikipedia.org/w/api.php')
+WIKIDATA_API_URL = os.getenv('WIKIDATA_API_URL', 'https://www.wikidata.org/w/api.php')
+
+# Планировщик запросов к Wikimedia
+HTTP_RATE_LIMIT = float(os.getenv('HTTP_RATE_LIMIT', 10))  # запросов в секунду на хост
+HTTP_RATE_BURST = int(os.getenv('HTTP_RATE_BURST', 20))  # запас для всплесков
+HTTP_CONCURRENCY = int(os.getenv('HTTP_CONCURRENCY', 32))  # одновременных запросов
+HTTP_INTERACTIVE_RESERVE = int(os.getenv('HTTP_INTERACTIVE_RESERVE', 4))  # мест только для поисков пользователей
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', 10))  # секунд на запрос
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', 3))
+HTTP_BACKOFF = float(os.getenv('HTTP_BACKOFF', 0.5))  # начальная задержка повтора, секунд
+HTTP_BACKOFF_MAX = float(os.getenv('HTTP_BACKOFF_MAX', 10))
+MAXLAG = int(os.getenv('MAXLAG', 5))  # секунд, параметр maxlag API MediaWiki
+# Дубль пользовательского запроса, если ответа нет дольше этого квантиля задержек хоста; 0 — без дублей
+HTTP_HEDGE_QUANTILE = float(os.getenv('HTTP_HEDGE_QUANTILE', 0.95))
+LOOKUP_DEADLINE = float(os.getenv('LOOKUP_DEADLINE', 3))  # секунд на поиск; не успевшее — без него, 0 — без срока
+
+# Кэш названий и данных о личностях
+CACHE_PATH = os.getenv('CACHE_PATH', 'cache.sqlite3')
+CACHE_MEMORY_SIZE = int(os.getenv('CACHE_MEMORY_SIZE', 20000))  # записей в памяти
+CACHE_MAX_ROWS = int(os.getenv('CACHE_MAX_ROWS', 500000))  # строк на диске для каждого вида
+CACHE_LABEL_TTL = int(os.getenv('CACHE_LABEL_TTL', 30 * 24 * 3600))  # секунд
+CACHE_PERSON_TTL = int(os.getenv('CACHE_PERSON_TTL', 24 * 3600))  # секунд
+
+# Постепенная отправка карточки: сначала по данным Википедии, затем правки
+PROGRESSIVE_CARDS = os.getenv('PROGRESSIVE_CARDS', '1') == '1'
+CARD_EDIT_INTERVAL = float(os.getenv('CARD_EDIT_INTERVAL', 1.0))  # секунд между правками
+
+# Режим работы: polling или webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL')  # свой Bot API сервер (например, для локальных тестов)
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # публичный адрес; если не задан, вебхук не регистрируется
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8080))
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', 1))  # процессов на одном порту
+# Процессов бота: общие лимиты частоты (HTTP_RATE_*, SEND_RATE_*) делятся между ними
+PROCESSES = WEBHOOK_WORKERS if BOT_MODE == 'webhook' else 1
+
+# Хранилище состояний FSM: memory, sqlite или redis
+FSM_STORAGE = os.getenv('FSM_STORAGE', 'memory')
+FSM_STORAGE_PATH = os.getenv('FSM_STORAGE_PATH', 'fsm.sqlite3')
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
+# Метрики: HTTP-сервер с /metrics и периодическая сводка в журнале (0 — выключено)
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')  # по умолчанию только локально
+METRICS_LOG_INTERVAL = float(os.getenv('METRICS_LOG_INTERVAL', 0))  # секунд
+
+# Фото личностей: file_id, полученные от Telegram, хранятся в кэше;
+# скачанные ботом фото — в TEMP_PHOTOS_DIR, размер каталога ограничен
+CACHE_PHOTO_TTL = int(os.getenv('CACHE_PHOTO_TTL', 30 * 24 * 3600))  # секунд
+TEMP_PHOTOS_DIR = os.getenv('TEMP_PHOTOS_DIR', 'temp_photos')
+TEMP_PHOTOS_MAX_MB = int(os.getenv('TEMP_PHOTOS_MAX_MB', 200))
+PHOTO_MAX_SIDE = int(os.getenv('PHOTO_MAX_SIDE', 1280))  # пикселей, для уменьшения нужен Pillow
+PHOTO_DOWNLOADS = int(os.getenv('PHOTO_DOWNLOADS', 4))  # одновременных загрузок
+
+# Пакетный поиск (/batch)
+BATCH_MAX_NAMES = int(os.getenv('BATCH_MAX_NAMES', 100))
+BATCH_MAX_FILE_SIZE = int(os.getenv('BATCH_MAX_FILE_SIZE', 256 * 1024))  # байт
+
+# Локальный индекс из дампа Викиданных (python -m app.dump_import); без файла не используется
+LOCAL_INDEX_PATH = os.getenv('LOCAL_INDEX_PATH', 'wikidata_index.sqlite3')
+
+# Подсказки названий (inline-режим и «возможно, вы имели в виду»)
+SUGGEST_LIMIT = int(os.getenv('SUGGEST_LIMIT', 10))  # подсказок в ответе
+SUGGEST_CACHE_TTL = int(os.getenv('SUGGEST_CACHE_TTL', 300))  # секунд
+SUGGEST_DEBOUNCE = float(os.getenv('SUGGEST_DEBOUNCE', 0.3))  # секунд паузы в наборе перед запросом к API
+SUGGEST_INDEX_SIZE = int(os.getenv('SUGGEST_INDEX_SIZE', 50000))  # названий найденных личностей в памяти
+
+# Прогрев кэша при запуске: самые часто находимые личности и список имён из файла
+WARMUP_SIZE = int(os.getenv('WARMUP_SIZE', 200))  # личностей из журнала поисков; 0 — не прогревать
+WARMUP_NAMES = os.getenv('WARMUP_NAMES')  # файл с именами, по одному в строке
+WARMUP_CONCURRENCY = int(os.getenv('WARMUP_CONCURRENCY', 2))  # пачек по 50 одновременно
+WARMUP_TIMEOUT = float(os.getenv('WARMUP_TIMEOUT', 60))  # секунд, дальше бот стартует без прогрева
+PREFETCH_TASKS = int(os.getenv('PREFETCH_TASKS', 4))  # фоновых загрузок связанных личностей; 0 — выключено
+
+# Очередь исходящих сообщений: лимиты Telegram на частоту отправки
+SEND_RATE_LIMIT = float(os.getenv('SEND_RATE_LIMIT', 30))  # сообщений в секунду на всех
+SEND_RATE_BURST = int(os.getenv('SEND_RATE_BURST', 30))
+SEND_CHAT_RATE = float(os.getenv('SEND_CHAT_RATE', 1))  # в секунду в личный чат
+SEND_CHAT_BURST = int(os.getenv('SEND_CHAT_BURST', 3))
+SEND_GROUP_RATE = float(os.getenv('SEND_GROUP_RATE', 20 / 60))  # в секунду в группу
+SEND_RETRIES = int(os.getenv('SEND_RETRIES', 3))  # повторов после RetryAfter
@@ -0,0 +1,175 @@
+"""Импорт дампа Викиданных в локальный индекс (LOCAL_INDEX_PATH).
+
+    python -m app.dump_import latest-all.json.bz2
+
+Дамп (JSON по элементу в строке, можно .bz2 или .gz) читается потоком
+и целиком в память не загружается. Первый проход сохраняет людей
+(P31 = Q5) со свойствами, которые нужны боту, второй — названия
+элементов, на которые они ссылаются, на языках цепочки LANGUAGES.
+"""
+import argparse
+import bz2
+import gzip
+import json
+import logging
+import re
+import time
+
+from app import config
+from app.languages import LANGUAGES
+from app.MWAPI import ITEM, PROPERTY_SCHEMA, is_human
+from app.local_index import (TITLE_ALIAS, TITLE_LABEL, TITLE_SITELINK,
+                             LocalIndexWriter)
+
+logger = logging.getLogger(__name__)
+
+SITE = "ruwiki"
+
+# Свойства, которые сохраняются в индексе: схема бота, P31 и изображение
+KEPT_PROPERTIES = frozenset(PROPERTY_SCHEMA) | {"P31", "P18"}
+
+# Первый "id" в строке дампа — идентификатор самого элемента
+_ID_RE = re.compile(r'"id":"Q(\d+)"')
+
+BATCH_SIZE = 10000
+
+
+def open_dump(path):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rt", encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def iter_lines(path):
+    """Строки дампа с элементами, без обрамляющих скобок массива."""
+    with open_dump(path) as dump:
+        for line in dump:
+            line = line.rstrip().rstrip(",")
+            if line not in ("", "[", "]"):
+                yield line
+
+
+def trim_entity(entity):
+    """Оставляет в элементе только то, что использует бот.
+
+    Возвращает урезанный элемент и Q-id элементов, на которые он ссылается.
+    """
+    claims = {}
+    referenced = set()
+    for property_id, property_claims in entity.get("claims", {}).items():
+        if property_id not in KEPT_PROPERTIES:
+            continue
+        kept = []
+        for claim in property_claims:
+            datavalue = claim["mainsnak"].get("datavalue")
+            if not datavalue or claim.get("rank") == "deprecated":
+                continue
+            kept.append({"mainsnak": {"datavalue": datavalue},
+                         "rank": claim.get("rank", "normal")})
+            if datavalue["type"] == ITEM and property_id in PROPERTY_SCHEMA:
+                referenced.add(datavalue["value"]["id"])
+        if kept:
+            claims[property_id] = kept
+
+    trimmed = {
+        "id": entity["id"],
+        "labels": _pick(entity.get("labels", {}), LANGUAGES),
+        "descriptions": _pick(entity.get("descriptions", {}), LANGUAGES),
+        "aliases": _pick(entity.get("aliases", {}), LANGUAGES),
+        "sitelinks": _pick(entity.get("sitelinks", {}), (SITE,)),
+        "claims": claims,
+    }
+    return trimmed, referenced
+
+
+def entity_titles(entity):
+    """Названия, по которым личность можно найти."""
+    titles = []
+    if SITE in entity["sitelinks"]:
+        titles.append((entity["sitelinks"][SITE]["title"], TITLE_SITELINK))
+    for language in LANGUAGES:
+        if language in entity["labels"]:
+            titles.append((entity["labels"][language]["value"], TITLE_LABEL))
+        for alias in entity["aliases"].get(language, []):
+            titles.append((alias["value"], TITLE_ALIAS))
+    return titles
+
+
+def import_people(path, writer):
+    """Первый проход: люди. Возвращает их число и номера упомянутых Q-id."""
+    people = 0
+    # Номера, а не строки "Q…": множество на миллионы элементов заметно меньше
+    referenced = set()
+    for line in iter_lines(path):
+        # Быстрый фильтр до разбора JSON: у человека есть значение Q5
+        if '"id":"Q5"' not in line:
+            continue
+        entity = json.loads(line)
+        if entity.get("type") != "item" or not is_human(entity):
+            continue
+
+        trimmed, item_ids = trim_entity(entity)
+        titles = entity_titles(trimmed)
+        if not titles:
+            continue
+        writer.add_person(trimmed, titles)
+        referenced.update(int(item_id[1:]) for item_id in item_ids)
+
+        people += 1
+        if people % BATCH_SIZE == 0:
+            writer.commit()
+            logger.info("Людей: %d", people)
+    writer.commit()
+    return people, referenced
+
+
+def import_labels(path, writer, referenced):
+    """Второй проход: названия упомянутых элементов."""
+    labels = {}
+    imported = 0
+    for line in iter_lines(path):
+        match = _ID_RE.search(line, 0, 200)
+        if not match or int(match.group(1)) not in referenced:
+            continue
+        found = _pick(json.loads(line).get("labels", {}), LANGUAGES)
+        if found:
+            labels[f"Q{match.group(1)}"] = {language: label["value"]
+                                            for language, label in found.items()}
+
+        if len(labels) >= BATCH_SIZE:
+            writer.add_labels(labels)
+            writer.commit()
+            imported += len(labels)
+            labels = {}
+            logger.info("Названий: %d", imported)
+    writer.add_labels(labels)
+    writer.commit()
+    return imported + len(labels)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Импорт дампа Викиданных в локальный индекс")
+    parser.add_argument("dump", help="latest-all.json(.bz2|.gz)")
+    parser.add_argument("--output", default=config.LOCAL_INDEX_PATH,
+                        help="файл индекса (по умолчанию LOCAL_INDEX_PATH)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    started = time.monotonic()
+    writer = LocalIndexWriter(args.output)
+    people, referenced = import_people(args.dump, writer)
+    logger.info("Людей: %d, упомянутых элементов: %d", people, len(referenced))
+    labels = import_labels(args.dump, writer, referenced)
+    writer.close()
+    logger.info("Готово за %.0f с: людей %d, названий %d, файл %s",
+                time.monotonic() - started, people, labels, args.output)
+
+
+def _pick(values, keys):
+    return {key: values[key] for key in keys if key in values}
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,38 @@
-from aiogram import F, Router, Bot
-from aiogram.filters import CommandStart, Command
-from aiogram.types import Message, CallbackQuery
+import asyncio
+import hashlib
+import time
+
+from aiogram import Bot, F, Router
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import CommandStart, Command, CommandObject
+from aiogram.types import (BufferedInputFile, CallbackQuery, InlineQuery,
+                           InlineQueryResultArticle, InputTextMessageContent, Message)
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 
 import app.keyboards as kb
-from app.MWAPI import get_person_info
+from app import config
+from app.batch import FORMATS, make_rows, parse_names, to_csv, to_json
+from app.languages import LANGUAGES, language
+from app.metrics import metrics
+from app.photos import send_photo
+from app.render import (CAPTION_LIMIT, TEXT_LIMIT, card_text, render_batch,
+                        render_card, render_section, section_text, suggestion_text)
+from app.MWAPI import (PAGE_NOT_FOUND, Person, get_people_info, get_person,
+                       get_person_info, load_section, save_person, stream_person_info)
+from app.scheduler import background, deadline
+from app.sender import deferred
+from app.storage import settings_key
+from app.suggest import suggester
+from app.warmup import prefetcher, query_log
 
 router = Router()
 
 
 class UserInput(StatesGroup):
     name = State()
-    current_person = State()  # Для хранения данных о текущей личности
-
-
-async def download_photo(file_id: str, file_path: str, bot: Bot):
-    file = await bot.get_file(file_id)
-    await bot.download_file(file.file_path, file_path)
+    current_person = State()  # В данных хранится только ключ записи о личности
+    batch = State()  # Ждём список имён или файл; в данных — формат выгрузки
 
 
 @router.message(CommandStart())
@@ -32,11 +47,36 @@ async def cmd_help(message: Message):
     await message.answer('Список команд:\n'
                          '/help - список команд\n'
                          '/find - поиск личности\n'
+                         '/batch - поиск по списку имён (можно файлом), '
+                         'результат в CSV или JSON: /batch json\n'
+                         '@имя_бота <начало имени> - подсказки в любом чате\n'
+                         '/language - язык данных из Викиданных\n'
                          '/cancel - отмена')
 
 
+@router.message(Command('language'))
+async def cmd_language(message: Message):
+    await message.answer('🌐 Язык названий и описаний из Викиданных:',
+                         reply_markup=kb.languages(LANGUAGES, language()))
+
+
+@router.callback_query(F.data.startswith('language:'))
+async def choose_language(callback: CallbackQuery, state: FSMContext):
+    """Сохраняет язык в настройках пользователя; применяет его LanguageMiddleware"""
+    code = callback.data.partition(':')[2]
+    if code not in LANGUAGES:
+        await callback.answer()
+        return
+    await state.storage.update_data(settings_key(state.key), {'language': code})
+    await callback.answer(f'Язык данных: {code}')
+    if code != language():
+        await callback.message.edit_reply_markup(reply_markup=kb.languages(LANGUAGES, code))
+
+
 @router.message(UserInput.name, F.text.lower() == 'отмена')
 @router.message(UserInput.name, Command('cancel'))
+@router.message(UserInput.batch, F.text.lower() == 'отмена')
+@router.message(UserInput.batch, Command('cancel'))
 async def cancel_search(message: Message, state: FSMContext):
     await state.clear()
     await message.answer('❌ Поиск отменен', reply_markup=kb.main)
@@ -49,140 +89,299 @@ async def request_name(message: Message, state: FSMContext):
     await message.answer('📑 Введите имя для поиска:', reply_markup=kb.cancel)
 
 
+@router.message(Command('batch'))
+async def cmd_batch(message: Message, state: FSMContext, command: CommandObject):
+    """/batch [csv|json], список имён — в том же сообщении или следующим"""
+    first_line, _, rest = (command.args or '').partition('\n')
+    output_format = first_line.strip().lower()
+    if output_format not in FORMATS:
+        output_format, rest = 'csv', command.args or ''
+
+    if rest.strip():
+        await state.clear()
+        await run_batch(message, rest, output_format)
+        return
+
+    await state.set_state(UserInput.batch)
+    await state.update_data(batch_format=output_format)
+    await message.answer(f'📋 Отправьте список имён, по одному в строке '
+                         f'(не больше {config.BATCH_MAX_NAMES}), или файл .txt/.csv',
+                         reply_markup=kb.cancel)
+
+
+@router.message(UserInput.batch, F.document)
+async def batch_file(message: Message, state: FSMContext, bot: Bot):
+    if message.document.file_size and message.document.file_size > config.BATCH_MAX_FILE_SIZE:
+        await message.answer(f'Файл слишком большой: не больше '
+                             f'{config.BATCH_MAX_FILE_SIZE // 1024} КБ')
+        return
+    data = await state.get_data()
+    await state.clear()
+    content = await bot.download(message.document)
+    text = content.read().decode('utf-8-sig', errors='replace')
+    is_csv = (message.document.file_name or '').lower().endswith('.csv')
+    await run_batch(message, text, data.get('batch_format', 'csv'), is_csv)
+
+
+@router.message(UserInput.batch, F.text)
+async def batch_text(message: Message, state: FSMContext):
+    data = await state.get_data()
+    await state.clear()
+    await run_batch(message, message.text, data.get('batch_format', 'csv'))
+
+
+async def run_batch(message: Message, text: str, output_format: str, is_csv=False):
+    """Ищет всех по списку пакетами и отправляет сводку и файл"""
+    names = parse_names(text, is_csv)
+    if not names:
+        await message.answer('Список имён пуст', reply_markup=kb.main)
+        return
+    skipped = max(0, len(names) - config.BATCH_MAX_NAMES)
+    names = names[:config.BATCH_MAX_NAMES]
+
+    await message.answer(f'⏳ Ищу информацию о {len(names)} личностях...')
+    # Пакет тяжелее одиночного поиска: уступает место запросам /find
+    with background(), metrics.span("batch"):
+        results = await get_people_info(names)
+    metrics.count("batch_names_total", len(names))
+    for name, info in results.items():
+        if "error" not in info:
+            suggester.remember(name, info)
+
+    rows = make_rows(names, results)
+    document = to_json(rows) if output_format == 'json' else to_csv(rows)
+    with deferred():
+        await message.answer(render_batch(rows, skipped), parse_mode="HTML",
+                             reply_markup=kb.main)
+        await message.answer_document(
+            BufferedInputFile(document, filename=f'batch.{output_format}'))
+
+
 async def send_person_info(message: Message, info: dict):
     """Функция для отправки основной информации о личности"""
 
-    birth_date = info.get('birth_date')
-    death_date = info.get('death_date')
-    occupations = ', '.join(info.get('occupations', []))
-    countries = ', '.join(info.get('countries', []))
-    description = info.get('description', '')
-    summary = info.get('summary', '')
     image_url = info.get('image_url')
 
-    info_message = f'<b>🪪 {info.get("full_name", "Неизвестно")}</b>\n\n'
-
-    if birth_date or death_date:
-        info_message += f'📅 <b>Годы жизни:</b> {birth_date} - {death_date}\n'
-    if occupations:
-        info_message += f'💼 <b>Род деятельности:</b> {occupations}\n'
-    if countries:
-        info_message += f'🌍 <b>Страны:</b> {countries}\n'
-    if description:
-        info_message += f'\n📃 {description}\n'
-    """if summary:
-        info_message += f'\nℹ️ {summary[:500]}...'"""
-
-    if image_url:
-        await message.answer_photo(photo=image_url, caption=info_message,
-                                   reply_markup=kb.more_info, parse_mode="HTML")
-    else:
-        await message.answer(info_message, reply_markup=kb.more_info, parse_mode="HTML")
+    with metrics.span("send_card"):
+        if image_url:
+            await send_photo(message, image_url, card_text(info, CAPTION_LIMIT),
+                             reply_markup=kb.more_info, parse_mode="HTML")
+        else:
+            await message.answer(card_text(info), reply_markup=kb.more_info, parse_mode="HTML")
 
 
-@router.message(UserInput.name)
+@router.message(UserInput.name, F.text)
 async def search_by_name(message: Message, state: FSMContext):
     name = message.text
     await message.answer(f'🔍 Ищу информацию о "{name}"...')
 
-    info = get_person_info(name)
+    if config.PROGRESSIVE_CARDS:
+        await search_progressively(message, state, name)
+        return
+
+    with deadline(config.LOOKUP_DEADLINE):
+        info = await get_person_info(name)
 
     if "error" in info:
-        await message.answer(info["error"], reply_markup=kb.main)
-        await state.clear()
+        await report_error(message, state, name, info["error"])
         return
 
-    await state.update_data(current_person=info)
+    person_found(name, info)
+    await state.update_data(current_person=save_person(Person.from_info(info)))
     await send_person_info(message, info)
     await state.set_state(UserInput.current_person)
 
 
-@router.callback_query(F.data == 'demographic data')
-async def demographic_data(callback: CallbackQuery, state: FSMContext):
-    data = await state.get_data()
-    person = data.get('current_person', {})
-
-    message_text = "<b>📊 Демографические данные:</b>\n\n"
-
-    if person.get('gender'):
-        message_text += f"👤 <b>Пол:</b> {', '.join(person['gender'])}\n"
-    if person.get('birth_date'):
-        message_text += f"🎂 <b>Дата рождения:</b> {person['birth_date']}\n"
-    if person.get('birth_place'):
-        message_text += f"🏠 <b>Место рождения:</b> {', '.join(person['birth_place'])}\n"
-    if person.get('death_date'):
-        message_text += f"⚰️ <b>Дата смерти:</b> {person['death_date']}\n"
-    if person.get('death_place'):
-        message_text += f"🕯️ <b>Место смерти:</b> {', '.join(person['death_place'])}\n"
-    if person.get('ethnic_group'):
-        message_text += f"🌐 <b>Этническая принадлежность:</b> {', '.join(person['ethnic_group'])}\n"
-    if person.get('religion'):
-        message_text += f"🙏 <b>Религия:</b> {', '.join(person['religion'])}\n"
-    if person.get('children'):
-        message_text += f"👨‍👩‍👧‍👦 <b>Дети:</b> {', '.join(person['children'])}\n"
-
-    await callback.message.answer(message_text, parse_mode="HTML")
-    await callback.answer()
-
-
-@router.callback_query(F.data == 'geographical information')
-async def geographical_info(callback: CallbackQuery, state: FSMContext):
-    data = await state.get_data()
-    person = data.get('current_person', {})
-
-    message_text = "<b>🌍 Географическая информация:</b>\n\n"
+async def search_progressively(message: Message, state: FSMContext, name: str):
+    """Отправляет карточку по данным Википедии и дополняет её по мере загрузки"""
+    card = ProgressiveCard(message)
+    info = {}
+
+    with deadline(config.LOOKUP_DEADLINE):
+        async for info, last in stream_person_info(name):
+            if "error" in info:
+                await card.discard()
+                await report_error(message, state, name, info["error"])
+                return
+            # Последнюю версию отправит finish: сразу с кнопками разделов
+            if not last:
+                await card.update(info)
+
+    person_found(name, info)
+    await state.update_data(current_person=save_person(Person.from_info(info)))
+    await card.finish(info)
+    await state.set_state(UserInput.current_person)
 
-    if person.get('countries'):
-        message_text += f"🏳️ <b>Гражданство:</b> {', '.join(person['countries'])}\n"
-    if person.get('birth_place'):
-        message_text += f"📍 <b>Место рождения:</b> {', '.join(person['birth_place'])}\n"
-    if person.get('death_place'):
-        message_text += f"⚰️ <b>Место смерти:</b> {', '.join(person['death_place'])}\n"
-    if person.get('languages'):
-        message_text += f"🗣️ <b>Языки:</b> {', '.join(person['languages'])}\n"
 
-    await callback.message.answer(message_text, parse_mode="HTML")
-    await callback.answer()
+def person_found(name: str, info: dict):
+    """Учёт найденной личности: подсказки, журнал для прогрева, фоновая загрузка"""
+    metrics.count("lookups_total", result="partial" if info.get("partial") else "found")
+    suggester.remember(name, info)
+    query_log.add(info["wikidata_id"])
+    prefetcher.person_shown(info)
+
+
+async def report_error(message: Message, state: FSMContext, name: str, error: str):
+    """Сообщает об ошибке поиска; если статьи нет — предлагает похожие названия"""
+    if error == PAGE_NOT_FOUND:
+        titles = [entry["title"] for entry in
+                  await suggester.suggest(name, limit=5, fuzzy=True)]
+        if titles:
+            metrics.count("lookups_total", result="suggested")
+            # Остаёмся в UserInput.name: нажатие на вариант — новый поиск
+            await message.answer(f'{error}. Возможно, вы имели в виду:',
+                                 reply_markup=kb.suggestions(titles))
+            return
+
+    metrics.count("lookups_total", result="error")
+    await message.answer(error, reply_markup=kb.main)
+    await state.clear()
 
 
-@router.callback_query(F.data == 'professional activity')
-async def professional_activity(callback: CallbackQuery, state: FSMContext):
-    data = await state.get_data()
-    person = data.get('current_person', {})
-
-    message_text = "<b>💼 Профессиональная деятельность:</b>\n\n"
-
-    if person.get('occupations'):
-        message_text += f"👔 <b>Род деятельности:</b> {', '.join(person['occupations'])}\n"
-    if person.get('educations'):
-        message_text += f"🎓 <b>Образование:</b> {', '.join(person['educations'])}\n"
-    if person.get('positions'):
-        message_text += f"🏛️ <b>Должности:</b> {', '.join(person['positions'])}\n"
-    if person.get('awards'):
-        message_text += f"🏆 <b>Награды:</b> {', '.join(person['awards'])}\n"
-    if person.get('notable_works'):
-        message_text += f"📚 <b>Известные работы:</b> {', '.join(person['notable_works'])}\n"
-
-    await callback.message.answer(message_text, parse_mode="HTML")
+class ProgressiveCard:
+    """Карточка, которая отправляется сразу и затем правится на месте.
+
+    Правки идут не чаще раза в CARD_EDIT_INTERVAL секунд: версии,
+    пришедшие быстрее, схлопываются в одну.
+    """
+
+    def __init__(self, message: Message):
+        self.message = message
+        self.card = None  # отправленное сообщение с карточкой
+        self.text = None  # текст, который сейчас видит пользователь
+        self._pending = None
+        self._flush_task = None
+        self._edited_at = 0.0
+        self.limit = TEXT_LIMIT  # у карточки с фото лимит подписи
+
+    async def update(self, info: dict):
+        if self.card is None:
+            image_url = info.get('image_url')
+            if image_url:
+                self.limit = CAPTION_LIMIT
+            text = render_card(info, self.limit)
+            with metrics.span("send_card"):
+                if image_url:
+                    self.card = await send_photo(self.message, image_url, text,
+                                                 parse_mode="HTML")
+                else:
+                    self.card = await self.message.answer(text, parse_mode="HTML")
+            self.text = text
+            self._edited_at = time.monotonic()
+            return
+
+        self._pending = render_card(info, self.limit)
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def finish(self, info: dict):
+        """Последняя правка: полный текст и кнопки разделов"""
+        if self.card is None:
+            await send_person_info(self.message, info)
+            return
+        await self._cancel_flush()
+        await self._edit(card_text(info, self.limit), reply_markup=kb.more_info)
+
+    async def discard(self):
+        """Удаляет карточку, если данные оказались непригодны"""
+        await self._cancel_flush()
+        if self.card is not None:
+            await self.card.delete()
+            self.card = None
+
+    async def _flush(self):
+        await self._wait_edit_interval()
+        # Берём последнюю версию: пришедшие во время ожидания заменили прежние
+        text = self._pending
+        self._flush_task = None
+        await self._edit(text)
+
+    async def _cancel_flush(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+
+    async def _wait_edit_interval(self):
+        delay = self._edited_at + config.CARD_EDIT_INTERVAL - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _edit(self, text: str, reply_markup=None):
+        await self._wait_edit_interval()
+        if text == self.text and reply_markup is None:
+            return
+
+        try:
+            with metrics.span("edit_card"):
+                if self.card.photo:
+                    await self.card.edit_caption(caption=text, parse_mode="HTML",
+                                                 reply_markup=reply_markup)
+                else:
+                    await self.card.edit_text(text, parse_mode="HTML",
+                                              reply_markup=reply_markup)
+        except TelegramBadRequest:
+            # "message is not modified" и т.п. — карточка уже актуальна
+            pass
+        self.text = text
+        self._edited_at = time.monotonic()
+
+
+# callback_data кнопок kb.more_info -> раздел
+SECTION_BUTTONS = {
+    'demographic data': 'demographic',
+    'geographical information': 'geographical',
+    'professional activity': 'professional',
+    'political-organizational affiliation': 'political',
+}
+
+
+@router.callback_query(F.data.in_(SECTION_BUTTONS))
+async def show_section(callback: CallbackQuery, state: FSMContext):
+    """Раздел текущей личности: готовый текст из кэша или загрузка раздела"""
+    section = SECTION_BUTTONS[callback.data]
+    handle = (await state.get_data()).get('current_person')
+
+    text = section_text(handle, section) if handle else None
+    if text is None:
+        person = await get_person(handle)
+        if person is None:
+            await callback.answer('Данные устарели, выполните поиск заново')
+            return
+        person = await load_section(person, section)
+        text = render_section(person, section)
+
+    # Ответ на нажатие не ограничен лимитом, раздел уступает карточкам
     await callback.answer()
+    with deferred():
+        await callback.message.answer(text, parse_mode="HTML")
 
 
-@router.callback_query(F.data == 'political-organizational affiliation')
-async def political_org_affiliation(callback: CallbackQuery,
-                                    state: FSMContext):
-    data = await state.get_data()
-    person = data.get('current_person', {})
-
-    message_text = "<b>🏛️ Политическая/организационная принадлежность:</b>\n\n"
-
-    if person.get('parties'):
-        message_text += f"🎗️ <b>Политические партии:</b> {', '.join(person['parties'])}\n"
-    if person.get('official_websites'):
-        websites = person['official_websites']
-        if isinstance(websites, list):
-            message_text += f"🌐 <b>Официальные сайты:</b> {', '.join(websites)}\n"
-        else:
-            message_text += f"🌐 <b>Официальный сайт:</b> {websites}\n"
+@router.inline_query()
+async def inline_search(query: InlineQuery):
+    """Подсказки по началу имени; в сеть — только после паузы в наборе"""
+    text = query.query.strip()
+    if len(text) < 2:
+        await query.answer([], cache_time=config.SUGGEST_CACHE_TTL)
+        return
 
-    await callback.message.answer(message_text, parse_mode="HTML")
-    await callback.answer()
\ No newline at end of file
+    entries = suggester.local(text)
+    if len(entries) < config.SUGGEST_LIMIT:
+        if not await suggester.debounce(query.from_user.id):
+            return  # пользователь продолжил набирать, ответим на новый запрос
+        with metrics.span("suggest"):
+            entries = await suggester.suggest(text)
+
+    await query.answer([
+        InlineQueryResultArticle(
+            id=hashlib.sha1(entry["title"].encode()).hexdigest(),
+            title=entry["title"],
+            description=entry["description"] or None,
+            thumbnail_url=entry["image_url"],
+            input_message_content=InputTextMessageContent(
+                message_text=suggestion_text(entry), parse_mode="HTML"),
+        ) for entry in entries
+    ], cache_time=config.SUGGEST_CACHE_TTL)
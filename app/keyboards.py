@@ -14,4 +14,19 @@ more_info = InlineKeyboardMarkup(inline_keyboard=[
     [InlineKeyboardButton(text="Географическая информация", callback_data='geographical information')],
     [InlineKeyboardButton(text="Профессиональная деятельность", callback_data='professional activity')],
     [InlineKeyboardButton(text="Политическая/организационная принадлежность", callback_data='political-organizational affiliation')]
-    ])
\ No newline at end of file
+    ])
+
+
+def suggestions(titles):
+    """Варианты названий: нажатие отправляет название как новый запрос"""
+    return ReplyKeyboardMarkup(keyboard=[[KeyboardButton(text=title)] for title in titles]
+                               + [[KeyboardButton(text="Отмена")]],
+                               resize_keyboard=True, one_time_keyboard=True)
+
+
+def languages(codes, current):
+    """Выбор языка данных; текущий отмечен галочкой"""
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text=f"✅ {code}" if code == current else code,
+                             callback_data=f'language:{code}')
+        for code in codes]])
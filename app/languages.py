@@ -0,0 +1,48 @@
+"""Языки названий, описаний и псевдонимов из Викиданных.
+
+Все языки цепочки LANGUAGES запрашиваются в одном wbgetentities, а
+нужный выбирается уже на месте: первый из цепочки, для которого есть
+значение. Поэтому смена языка не стоит лишних запросов — только
+другие ключи кэша у записей, собранных для этого языка.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from app import config
+
+LANGUAGES = tuple(config.LANGUAGES)
+
+_language = contextvars.ContextVar("language", default=LANGUAGES[0])
+
+
+@contextmanager
+def use_language(language):
+    """Язык данных внутри блока (и в созданных в нём задачах)."""
+    token = _language.set(language)
+    try:
+        yield
+    finally:
+        _language.reset(token)
+
+
+def language():
+    return _language.get()
+
+
+def fallback_chain():
+    """Текущий язык, затем остальные языки LANGUAGES по порядку."""
+    current = _language.get()
+    return (current,) + tuple(code for code in LANGUAGES if code != current)
+
+
+def pick(values):
+    """Значение первого языка цепочки из словаря язык -> значение."""
+    for code in fallback_chain():
+        if values.get(code):
+            return values[code]
+    return None
+
+
+def keyed(key):
+    """Ключ кэша для данных на текущем языке."""
+    return f"{key}:{_language.get()}"
@@ -0,0 +1,132 @@
+import json
+import logging
+import os
+import sqlite3
+import zlib
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+# Откуда пришло название в индексе: при совпадении побеждает меньший ранг
+TITLE_SITELINK = 0  # статья в русской Википедии
+TITLE_LABEL = 1  # название элемента на одном из языков LANGUAGES
+TITLE_ALIAS = 2  # псевдоним на одном из языков LANGUAGES
+
+
+def title_key(title):
+    """Ключ поиска по названию: без учёта регистра, пробелов и подчёркиваний."""
+    return " ".join(title.replace("_", " ").split()).casefold()
+
+
+class LocalIndex:
+    """Локальный индекс личностей, собранный из дампа Викиданных.
+
+    Файл создаётся командой python -m app.dump_import. Если файла нет,
+    индекс выключен и все запросы идут в API.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._db = None
+
+    @property
+    def enabled(self):
+        return self._db is not None
+
+    def open(self):
+        if self._db is not None or not self.path or not os.path.exists(self.path):
+            return
+        self._db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        count = self._db.execute("SELECT COUNT(*) FROM persons").fetchone()[0]
+        logger.info("Локальный индекс открыт: %s, личностей: %d", self.path, count)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def find(self, title):
+        """Q-id личности по названию статьи, названию или псевдониму."""
+        if self._db is None:
+            return None
+        row = self._db.execute("SELECT qid FROM titles WHERE title = ?",
+                               (title_key(title),)).fetchone()
+        return row[0] if row else None
+
+    def search(self, prefix, limit=10):
+        """Q-id личностей, у которых название или псевдоним начинается с prefix."""
+        if self._db is None:
+            return []
+        key = title_key(prefix)
+        # Диапазон по первичному ключу: без сортировки всех совпадений
+        rows = self._db.execute(
+            "SELECT qid FROM titles WHERE title >= ? AND title < ? ORDER BY title LIMIT ?",
+            (key, key + "\U0010ffff", limit * 4)).fetchall()
+        return list(dict.fromkeys(qid for qid, in rows))[:limit]
+
+    def get_entity(self, qid):
+        """Элемент в том же виде, что возвращает wbgetentities."""
+        if self._db is None:
+            return None
+        row = self._db.execute("SELECT entity FROM persons WHERE qid = ?",
+                               (qid,)).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def get_labels(self, item_ids):
+        """Названия элементов, которые есть в индексе: Q-id -> {язык: название}."""
+        if self._db is None or not item_ids:
+            return {}
+        labels = {}
+        for i in range(0, len(item_ids), 500):
+            chunk = item_ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for qid, label in self._db.execute(
+                    f"SELECT qid, label FROM labels WHERE qid IN ({placeholders})", chunk):
+                labels[qid] = json.loads(label)
+        return labels
+
+
+class LocalIndexWriter:
+    """Запись индекса; используется только импортом дампа."""
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=OFF")
+        self._db.execute("PRAGMA synchronous=OFF")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS persons (qid TEXT PRIMARY KEY, entity BLOB NOT NULL);
+            CREATE TABLE IF NOT EXISTS titles (
+                title TEXT PRIMARY KEY, qid TEXT NOT NULL, rank INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS labels (qid TEXT PRIMARY KEY, label TEXT NOT NULL);
+        """)
+
+    def add_person(self, entity, titles):
+        """titles — пары (название, ранг TITLE_*)."""
+        self._db.execute(
+            "INSERT OR REPLACE INTO persons VALUES (?, ?)",
+            (entity["id"], zlib.compress(
+                json.dumps(entity, ensure_ascii=False, separators=(",", ":")).encode())))
+        self._db.executemany(
+            "INSERT INTO titles VALUES (?, ?, ?) ON CONFLICT (title) DO UPDATE"
+            " SET qid = excluded.qid, rank = excluded.rank"
+            " WHERE excluded.rank < titles.rank",
+            [(title_key(title), entity["id"], rank) for title, rank in titles])
+
+    def add_labels(self, labels):
+        """labels — Q-id -> {язык: название}."""
+        self._db.executemany(
+            "INSERT OR REPLACE INTO labels VALUES (?, ?)",
+            [(qid, json.dumps(values, ensure_ascii=False, separators=(",", ":")))
+             for qid, values in labels.items()])
+
+    def commit(self):
+        self._db.commit()
+
+    def close(self):
+        self._db.commit()
+        self._db.execute("VACUUM")
+        self._db.close()
+
+
+local_index = LocalIndex(config.LOCAL_INDEX_PATH)
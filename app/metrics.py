@@ -0,0 +1,164 @@
+import asyncio
+import bisect
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+from aiohttp import web
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержек, секунд
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # последняя — +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Оценка квантиля по корзинам (верхняя граница корзины)."""
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(BUCKETS + (float("inf"),), self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    """Счётчики и гистограммы задержек процесса.
+
+    Запись — это несколько операций со словарём, поэтому метрики
+    можно не выключать в продакшене. Значения копятся с запуска
+    процесса; у каждого воркера вебхука они свои.
+    """
+
+    def __init__(self):
+        self.counters = {}  # (имя, метки) -> значение
+        self.histograms = {}  # (имя, метки) -> Histogram
+        self._collectors = []
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(labels.items()))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(labels.items()))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, stage):
+        """Замеряет стадию; исключение учитывается как ошибка по типу."""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.count("errors_total", stage=stage, type=type(e).__name__)
+            raise
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - started, stage=stage)
+
+    def add_collector(self, collector, kind="counter"):
+        """collector() возвращает список (имя, метки, значение) для счётчиков,
+        которые ведутся в другом месте (например, в кэше); kind="gauge" —
+        для текущих значений (например, длины очереди)."""
+        self._collectors.append((collector, kind))
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus."""
+        counters = dict(self.counters)
+        kinds = {}
+        for collector, kind in self._collectors:
+            for name, labels, value in collector():
+                counters[(name, tuple(labels.items()))] = value
+                kinds[name] = kind
+
+        lines = []
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE historiographer_{name} {kinds.get(name, 'counter')}")
+            for (metric, labels), value in counters.items():
+                if metric == name:
+                    lines.append(f"historiographer_{name}{_labels(labels)} {value}")
+
+        for name in sorted({name for name, _ in self.histograms}):
+            lines.append(f"# TYPE historiographer_{name} histogram")
+            for (metric, labels), histogram in self.histograms.items():
+                if metric != name:
+                    continue
+                total = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), histogram.counts):
+                    total += count
+                    lines.append(f"historiographer_{name}_bucket"
+                                 f"{_labels(labels + (('le', bound),))} {total}")
+                lines.append(f"historiographer_{name}_sum{_labels(labels)} {histogram.sum:.6f}")
+                lines.append(f"historiographer_{name}_count{_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Краткая сводка для журнала: задержки по стадиям и счётчики."""
+        latencies = {}
+        for (name, labels), histogram in self.histograms.items():
+            if histogram.count:
+                key = ",".join(str(value) for _, value in labels) or name
+                latencies[key] = {
+                    "n": histogram.count,
+                    "avg_ms": round(histogram.sum / histogram.count * 1000, 1),
+                    "p95_ms": histogram.quantile(0.95) * 1000,
+                }
+        counters = {}
+        for (name, labels), value in self.counters.items():
+            key = name + "".join(f",{label}" for _, label in labels)
+            counters[key] = value
+        return {"latency": latencies, "counters": counters}
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+async def handle_metrics(request):
+    return web.Response(text=metrics.render(),
+                        content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server(port):
+    """Отдельный HTTP-сервер с /metrics на порту port.
+
+    Метрики у каждого процесса свои, поэтому у каждого воркера вебхука
+    свой порт: иначе Prometheus опрашивал бы случайный процесс.
+    """
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, config.METRICS_HOST, port).start()
+    return runner
+
+
+async def log_metrics(interval):
+    """Периодически пишет сводку метрик в журнал одной строкой JSON."""
+    while True:
+        await asyncio.sleep(interval)
+        logger.info("metrics %s", json.dumps(metrics.summary(), ensure_ascii=False))
+
+
+metrics = Metrics()
@@ -0,0 +1,36 @@
+import time
+
+from aiogram import BaseMiddleware
+
+from app.languages import LANGUAGES, use_language
+from app.metrics import metrics
+from app.storage import settings_key
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Время обработки обновлений и ошибки по обработчикам."""
+
+    async def __call__(self, handler, event, data):
+        name = data["handler"].callback.__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            metrics.count("errors_total", stage=f"handler:{name}", type=type(e).__name__)
+            raise
+        finally:
+            metrics.observe("update_seconds", time.perf_counter() - started, handler=name)
+
+
+class LanguageMiddleware(BaseMiddleware):
+    """Язык данных, выбранный пользователем (/language), на время обработки."""
+
+    async def __call__(self, handler, event, data):
+        state = data.get("state")
+        if state is None:
+            return await handler(event, data)
+        code = (await state.storage.get_data(settings_key(state.key))).get("language")
+        if code not in LANGUAGES:
+            return await handler(event, data)
+        with use_language(code):
+            return await handler(event, data)
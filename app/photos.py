@@ -0,0 +1,177 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+from pathlib import Path
+
+import aiohttp
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile
+
+from app import config
+from app.cache import cache
+from app.metrics import metrics
+from app.MWAPI import open_session
+
+logger = logging.getLogger(__name__)
+
+# Telegram не принимает фото больше 10 МБ
+MAX_PHOTO_SIZE = 10 * 1024 * 1024
+
+
+class PhotoStore:
+    """Фото личностей, скачанные в TEMP_PHOTOS_DIR.
+
+    Нужны, когда Telegram не может сам скачать картинку по URL, и для
+    заблаговременной загрузки (prefetch). Размер каталога ограничен:
+    при переполнении удаляются файлы, которые дольше всего не
+    использовались (время изменения обновляется при каждом использовании).
+    """
+
+    def __init__(self, directory, max_bytes, max_side, concurrency):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_side = max_side
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._downloads = {}  # URL -> задача загрузки
+
+    def path(self, url):
+        return self.directory / (hashlib.sha1(url.encode()).hexdigest() + ".jpg")
+
+    def get(self, url):
+        """Путь к скачанному фото или None."""
+        path = self.path(url)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def prefetch(self, url):
+        """Скачивает фото в фоне, если Telegram его ещё не видел."""
+        if url and cache.get("photo", url) is None and not self.path(url).exists():
+            self._start(url)
+
+    async def download(self, url):
+        """Скачивает фото (или дожидается уже идущей загрузки)."""
+        return await asyncio.shield(self._start(url))
+
+    def _start(self, url):
+        task = self._downloads.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._download(url))
+            self._downloads[url] = task
+            task.add_done_callback(lambda _: self._downloads.pop(url, None))
+        return task
+
+    async def _download(self, url):
+        async with self._semaphore:
+            try:
+                with metrics.span("photo_download"):
+                    session = await open_session()
+                    async with session.get(url, timeout=aiohttp.ClientTimeout(
+                            total=config.HTTP_TIMEOUT)) as response:
+                        response.raise_for_status()
+                        if (response.content_length or 0) > MAX_PHOTO_SIZE * 4:
+                            return None
+                        data = await response.read()
+                data = await asyncio.to_thread(self._resize, data)
+                if len(data) > MAX_PHOTO_SIZE:
+                    return None
+                path = self.path(url)
+                self.directory.mkdir(parents=True, exist_ok=True)
+                temporary = path.with_suffix(".part")
+                temporary.write_bytes(data)
+                temporary.replace(path)
+            except Exception as e:
+                logger.warning("Не удалось скачать фото %s: %r", url, e)
+                return None
+        self._evict()
+        return path
+
+    def _resize(self, data):
+        """Уменьшает фото до max_side по большей стороне (если есть Pillow)."""
+        try:
+            from PIL import Image
+        except ImportError:
+            return data
+        try:
+            image = Image.open(io.BytesIO(data))
+            if max(image.size) <= self.max_side and image.format == "JPEG":
+                return data
+            image.thumbnail((self.max_side, self.max_side))
+            output = io.BytesIO()
+            image.convert("RGB").save(output, "JPEG", quality=85)
+            return output.getvalue()
+        except Exception:
+            return data
+
+    def _evict(self):
+        files = []
+        for path in self.directory.glob("*.jpg"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        if total <= self.max_bytes:
+            return
+        # Освобождаем с запасом, чтобы не чистить каталог после каждой загрузки
+        for _, size, path in sorted(files):
+            path.unlink(missing_ok=True)
+            total -= size
+            if total <= self.max_bytes * 0.9:
+                break
+
+
+async def send_photo(message, image_url, caption, **kwargs):
+    """Отправляет фото, по возможности не загружая его в Telegram заново.
+
+    Порядок: file_id из прошлой отправки, скачанный файл, URL, а если
+    Telegram не смог скачать картинку сам — загрузка файла ботом.
+    Если фото отправить не удалось совсем, уходит текст без фото.
+    """
+    file_id = cache.get("photo", image_url)
+    if file_id is not None:
+        try:
+            sent = await message.answer_photo(photo=file_id, caption=caption, **kwargs)
+            metrics.count("photo_sends_total", source="file_id")
+            return sent
+        except TelegramBadRequest:
+            logger.info("file_id фото устарел: %s", image_url)
+
+    path = photo_store.get(image_url)
+    try:
+        sent = await message.answer_photo(
+            photo=FSInputFile(path) if path else image_url, caption=caption, **kwargs)
+        metrics.count("photo_sends_total", source="file" if path else "url")
+    except TelegramBadRequest as e:
+        # Обычно "failed to get HTTP URL content" или слишком большая картинка
+        logger.info("Telegram не принял фото %s: %s", image_url, e.message)
+        sent = None
+        # Скачанный файл уже пробовали — загружать его заново бессмысленно
+        path = None if path else await photo_store.download(image_url)
+        if path is not None:
+            try:
+                sent = await message.answer_photo(photo=FSInputFile(path),
+                                                  caption=caption, **kwargs)
+                metrics.count("photo_sends_total", source="file")
+            except TelegramBadRequest:
+                pass
+        if sent is None:
+            metrics.count("photo_sends_total", source="none")
+            return await message.answer(caption, **kwargs)
+
+    if sent.photo:
+        cache.set("photo", image_url, sent.photo[-1].file_id)
+    return sent
+
+
+photo_store = PhotoStore(
+    directory=config.TEMP_PHOTOS_DIR,
+    max_bytes=config.TEMP_PHOTOS_MAX_MB * 1024 * 1024,
+    max_side=config.PHOTO_MAX_SIDE,
+    concurrency=config.PHOTO_DOWNLOADS,
+)
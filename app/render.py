@@ -0,0 +1,185 @@
+"""Тексты сообщений: карточка личности и разделы kb.more_info.
+
+Экранирование HTML и лимиты Telegram (подпись к фото — 1024 символа,
+сообщение — 4096) учитываются только здесь. Готовые тексты полной
+карточки и разделов хранятся в кэше рядом с записью о личности,
+поэтому повторный показ — это поиск в кэше.
+"""
+import html
+from urllib.parse import quote
+
+from app.cache import cache
+from app.languages import language
+
+CAPTION_LIMIT = 1024
+TEXT_LIMIT = 4096
+
+# Раздел -> заголовок и строки: (поле Person, подпись[, подпись для одного значения])
+SECTIONS = {
+    "demographic": ("<b>📊 Демографические данные:</b>", (
+        ("gender", "👤 <b>Пол:</b>"),
+        ("birth_date", "🎂 <b>Дата рождения:</b>"),
+        ("birth_place", "🏠 <b>Место рождения:</b>"),
+        ("death_date", "⚰️ <b>Дата смерти:</b>"),
+        ("death_place", "🕯️ <b>Место смерти:</b>"),
+        ("ethnic_group", "🌐 <b>Этническая принадлежность:</b>"),
+        ("religion", "🙏 <b>Религия:</b>"),
+        ("children", "👨‍👩‍👧‍👦 <b>Дети:</b>"),
+    )),
+    "geographical": ("<b>🌍 Географическая информация:</b>", (
+        ("countries", "🏳️ <b>Гражданство:</b>"),
+        ("birth_place", "📍 <b>Место рождения:</b>"),
+        ("death_place", "⚰️ <b>Место смерти:</b>"),
+        ("languages", "🗣️ <b>Языки:</b>"),
+    )),
+    "professional": ("<b>💼 Профессиональная деятельность:</b>", (
+        ("occupations", "👔 <b>Род деятельности:</b>"),
+        ("educations", "🎓 <b>Образование:</b>"),
+        ("positions", "🏛️ <b>Должности:</b>"),
+        ("awards", "🏆 <b>Награды:</b>"),
+        ("notable_works", "📚 <b>Известные работы:</b>"),
+    )),
+    "political": ("<b>🏛️ Политическая/организационная принадлежность:</b>", (
+        ("parties", "🎗️ <b>Политические партии:</b>"),
+        ("official_websites", "🌐 <b>Официальные сайты:</b>", "🌐 <b>Официальный сайт:</b>"),
+    )),
+}
+
+
+def escape(value):
+    return html.escape(str(value), quote=False)
+
+
+def text_length(text):
+    """Длина в единицах UTF-16, как считает Telegram (с запасом: с разметкой)."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def fit(lines, limit):
+    """Собирает сообщение из строк не длиннее limit.
+
+    Строка — тройка (начало в HTML, текст, конец в HTML); экранируется
+    только текст. Не влезающая строка обрезается по тексту с «…»,
+    следующие отбрасываются, поэтому разметка не рвётся.
+    """
+    parts = []
+    used = 0
+    for head, body, tail in lines:
+        line = head + escape(body) + tail
+        size = text_length(line)
+        if used + size <= limit:
+            parts.append(line)
+            used += size
+            continue
+
+        room = limit - used - text_length(head + tail) - 1
+        cut = _cut(body, room)
+        if cut:
+            parts.append(head + escape(cut) + "…" + tail)
+        break
+    return "".join(parts)
+
+
+def _cut(body, room):
+    """Самое длинное начало текста, которое после экранирования влезает в room."""
+    low, high = 0, len(body)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if text_length(escape(body[:middle])) <= room:
+            low = middle
+        else:
+            high = middle - 1
+    cut = body[:low]
+    # Режем по границе значения списка, если она не слишком далеко
+    comma = cut.rfind(", ")
+    if comma > len(cut) // 2:
+        cut = cut[:comma]
+    return cut.rstrip()
+
+
+def _values(value):
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(item) for item in value)
+    return str(value)
+
+
+def card_lines(info):
+    lines = [("<b>🪪 ", info.get("full_name") or "Неизвестно", "</b>\n\n")]
+
+    birth_date = info.get("birth_date")
+    death_date = info.get("death_date")
+    if birth_date or death_date:
+        lines.append(("📅 <b>Годы жизни:</b> ",
+                      f"{birth_date or '?'} - {death_date or '...'}", "\n"))
+    if info.get("occupations"):
+        lines.append(("💼 <b>Род деятельности:</b> ", _values(info["occupations"]), "\n"))
+    if info.get("countries"):
+        lines.append(("🌍 <b>Страны:</b> ", _values(info["countries"]), "\n"))
+    if info.get("description"):
+        lines.append(("\n📃 ", info["description"], "\n"))
+    return lines
+
+
+def render_card(info, limit=TEXT_LIMIT):
+    """Текст карточки личности по записи (в том числе неполной)."""
+    return fit(card_lines(info), limit)
+
+
+def card_text(info, limit=TEXT_LIMIT):
+    """Текст полной карточки; для личности из Викиданных берётся из кэша."""
+    wikidata_id = info.get("wikidata_id")
+    if not wikidata_id or info.get("partial"):
+        return render_card(info, limit)
+    key = f"{wikidata_id}:{language()}:card:{limit}"
+    text = cache.get("render", key)
+    if text is None:
+        text = render_card(info, limit)
+        cache.set("render", key, text)
+    return text
+
+
+def section_text(wikidata_id, section):
+    """Готовый текст раздела из кэша или None, если его ещё не строили."""
+    return cache.get("render", f"{wikidata_id}:{language()}:{section}")
+
+
+def render_section(person, section):
+    """Строит текст раздела; текст полностью загруженного сохраняет в кэш."""
+    title, fields = SECTIONS[section]
+    lines = [(title + "\n\n", "", "")]
+    for name, label, *single in fields:
+        value = getattr(person, name)
+        if single and isinstance(value, str):
+            label = single[0]
+        if value:
+            lines.append((label + " ", _values(value), "\n"))
+    text = fit(lines, TEXT_LIMIT)
+    if section in person.loaded_sections:
+        cache.set("render", f"{person.wikidata_id}:{language()}:{section}", text)
+    return text
+
+
+def suggestion_text(entry):
+    """Сообщение, которое отправляется в чат при выборе inline-подсказки."""
+    url = "https://ru.wikipedia.org/wiki/" + quote(entry["title"].replace(" ", "_"))
+    lines = [("<b>🪪 ", entry["title"], "</b>\n")]
+    if entry.get("description"):
+        lines.append(("📃 ", entry["description"], "\n"))
+    lines.append((f'\n<a href="{url}">Статья в Википедии</a>', "", ""))
+    return fit(lines, TEXT_LIMIT)
+
+
+def render_batch(rows, skipped=0, limit=TEXT_LIMIT):
+    """Сводка пакетного поиска: строка на имя, полные данные — в файле."""
+    found = sum(1 for row in rows if not row["error"])
+    lines = [(f"<b>📋 Найдено {found} из {len(rows)}</b>\n", "", "")]
+    if skipped:
+        lines.append(("", f"Сверх лимита пропущено имён: {skipped}", "\n"))
+    lines.append(("\n", "", ""))
+    for row in rows:
+        if row["error"]:
+            lines.append(("❌ ", f"{row['query']} — {row['error']}", "\n"))
+        else:
+            years = f" ({row['birth_date'] or '?'} – {row['death_date'] or '...'})"
+            lines.append(("✅ ", f"{row['query']} — {row['full_name']}{years}", "\n"))
+    return fit(lines, limit)
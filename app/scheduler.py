@@ -0,0 +1,379 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from app import config
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты запросов: пользовательские поиски идут раньше фоновой работы
+INTERACTIVE = 0
+BACKGROUND = 1
+
+_priority = contextvars.ContextVar("request_priority", default=INTERACTIVE)
+_deadline = contextvars.ContextVar("lookup_deadline", default=None)
+
+# Задачи, доделывающие работу после срока; ссылки держатся до их завершения
+_late = set()
+
+
+@contextmanager
+def background():
+    """Запросы внутри блока (и в созданных в нём задачах) — фоновые."""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+@contextmanager
+def deadline(seconds):
+    """Срок для ожиданий until_deadline внутри блока; 0 — без срока."""
+    token = _deadline.set(time.monotonic() + seconds if seconds else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def has_deadline():
+    return _deadline.get() is not None
+
+
+async def until_deadline(awaitable):
+    """Результат awaitable или asyncio.TimeoutError, если срок истёк.
+
+    По сроку прекращается только ожидание: сама работа продолжается
+    и, например, сохраняет загруженные названия в кэш.
+    """
+    expires = _deadline.get()
+    if expires is None:
+        return await awaitable
+    task = asyncio.ensure_future(awaitable)
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), expires - time.monotonic())
+    except asyncio.TimeoutError:
+        metrics.count("deadline_exceeded_total")
+        _keep_late(task)
+        raise
+
+
+def backfill(coroutine):
+    """Выполняет coroutine в фоне без срока.
+
+    Для данных, не успевших к ответу: они попадут в кэш к следующему поиску.
+    """
+    context = contextvars.copy_context()
+    context.run(_deadline.set, None)
+    context.run(_priority.set, BACKGROUND)
+    _keep_late(asyncio.get_running_loop().create_task(coroutine, context=context))
+    metrics.count("backfills_total")
+
+
+def _keep_late(task):
+    _late.add(task)
+    task.add_done_callback(_late_done)
+
+
+def _late_done(task):
+    _late.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.info("Фоновая догрузка не удалась: %r", task.exception())
+
+
+class RequestError(Exception):
+    """Запрос не удался после всех повторов."""
+
+
+class TokenBucket:
+    """Ограничение частоты запросов к одному хосту."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # пауза по Retry-After
+
+    async def take(self, spare=0):
+        """Забирает токен, при необходимости дожидаясь его.
+
+        spare > 0 — фоновый запрос: он ждёт, пока свободных токенов станет
+        больше spare, и не берёт токен в долг, поэтому не отодвигает
+        пользовательские запросы.
+        """
+        spare = min(spare, self.capacity - 1)
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if not spare:
+                break
+            if self.tokens >= spare + 1 and self.blocked_until <= now:
+                self.tokens -= 1
+                return
+            await asyncio.sleep(max(self.blocked_until - now,
+                                    (spare + 1 - self.tokens) / self.rate))
+
+        # Токен резервируется сразу, даже в долг: ожидающие встают в очередь
+        self.tokens -= 1
+        delay = max(self.blocked_until - now, -self.tokens / self.rate, 0)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def block(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def available(self):
+        """Сколько токенов можно взять сейчас, не уходя в долг."""
+        now = time.monotonic()
+        if self.blocked_until > now:
+            return 0
+        return min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+
+
+class PriorityLimiter:
+    """Ограничение числа одновременных запросов с приоритетами.
+
+    Освободившееся место получает самый приоритетный ожидающий;
+    reserved мест доступны только пользовательским запросам.
+    """
+
+    def __init__(self, limit, reserved):
+        self.limit = limit
+        self.reserved = reserved
+        self.active = 0
+        self._waiters = []  # куча (приоритет, номер, Future)
+        self._counter = itertools.count()
+
+    async def acquire(self, priority):
+        if self._allowed(priority) and (
+                not self._waiters or priority < self._waiters[0][0]):
+            self.active += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self.active -= 1
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.cancelled():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._allowed(priority):
+                break
+            heapq.heappop(self._waiters)
+            self.active += 1
+            future.set_result(None)
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def _allowed(self, priority):
+        limit = self.limit if priority == INTERACTIVE else self.limit - self.reserved
+        return self.active < limit
+
+
+class LatencyWindow:
+    """Задержки последних успешных запросов к хосту."""
+
+    def __init__(self, size=200, min_samples=20):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+        self._quantiles = {}  # кэш квантилей до следующего пересчёта
+        self._added = 0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self._added += 1
+        # Пересчитываем не на каждый запрос: сортировка окна не бесплатна
+        if self._added >= 20:
+            self._added = 0
+            self._quantiles.clear()
+
+    def quantile(self, q):
+        """Квантиль задержки или None, пока замеров мало."""
+        if len(self.samples) < self.min_samples:
+            return None
+        value = self._quantiles.get(q)
+        if value is None:
+            ordered = sorted(self.samples)
+            value = self._quantiles[q] = ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+        return value
+
+
+class RequestScheduler:
+    """Единая точка выхода для всех запросов к API Wikimedia.
+
+    Ограничивает частоту запросов к каждому хосту и их общее число,
+    повторяет неудачные запросы с экспоненциальной задержкой, учитывает
+    Retry-After и ответы maxlag. Пользовательский запрос, который
+    отвечает дольше обычного (квантиль hedge_quantile задержек хоста),
+    дублируется; используется ответ, пришедший первым.
+    """
+
+    def __init__(self, rate, burst, concurrency, reserved, timeout,
+                 retries, backoff, max_backoff, maxlag, hedge_quantile=None):
+        self.rate = rate
+        self.burst = burst
+        self.limiter = PriorityLimiter(concurrency, reserved)
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.maxlag = maxlag
+        self.hedge_quantile = hedge_quantile
+        self._buckets = {}
+        self._latencies = {}  # хост -> LatencyWindow
+
+    async def get_json(self, session, url, params):
+        host = urlsplit(url).hostname
+        bucket = self._buckets.setdefault(host, TokenBucket(self.rate, self.burst))
+        latencies = self._latencies.setdefault(host, LatencyWindow())
+        params = {**params, "maxlag": self.maxlag}
+        priority = _priority.get()
+
+        for attempt in range(self.retries + 1):
+            hedge_delay = (latencies.quantile(self.hedge_quantile)
+                           if self.hedge_quantile and priority == INTERACTIVE else None)
+            if hedge_delay is None:
+                data, error, retry_after = await self._attempt(
+                    session, url, params, host, bucket, latencies, priority)
+            else:
+                data, error, retry_after = await self._hedged(
+                    session, url, params, host, bucket, latencies, priority, hedge_delay)
+            if error is None:
+                return data
+
+            if attempt == self.retries:
+                break
+            metrics.count("http_retries_total", host=host)
+            if retry_after is not None:
+                # Сервер просит подождать — паузу соблюдают все запросы к хосту
+                bucket.block(retry_after)
+                delay = retry_after
+            else:
+                delay = self._backoff(attempt)
+            logger.warning("%s: %s, повтор через %.1f с", host, error, delay)
+            await asyncio.sleep(delay)
+
+        metrics.count("http_failures_total", host=host)
+        raise RequestError(f"{host}: {error}")
+
+    async def _attempt(self, session, url, params, host, bucket, latencies, priority,
+                       sent=None):
+        """Один запрос: (данные, None, None) или (None, ошибка, Retry-After).
+
+        sent (asyncio.Event) выставляется, когда запрос получил место
+        и токен и уходит на сервер.
+        """
+        retry_after = None
+        await self.limiter.acquire(priority)
+        try:
+            # Фоновым запросам — только токены сверх запаса для пользователей
+            await bucket.take(self.limiter.reserved if priority == BACKGROUND else 0)
+            if sent is not None:
+                sent.set()
+            started = time.monotonic()
+            async with session.get(url, params=params,
+                                   timeout=self.timeout) as response:
+                metrics.count("http_requests_total", host=host, status=response.status)
+                retry_after = _retry_after(response)
+                if response.status == 429 or response.status >= 500:
+                    error = f"HTTP {response.status}"
+                else:
+                    response.raise_for_status()
+                    data = await response.json(content_type=None)
+                    if not _is_maxlag(data):
+                        latencies.add(time.monotonic() - started)
+                        return data, None, None
+                    error = "maxlag"
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            metrics.count("http_requests_total", host=host, status=type(e).__name__)
+            error = repr(e)
+        finally:
+            self.limiter.release()
+        return None, error, retry_after
+
+    async def _hedged(self, session, url, params, host, bucket, latencies, priority, delay):
+        """Запрос с дублем через delay секунд после отправки, если первый ещё не ответил."""
+        sent = asyncio.Event()
+        tasks = {asyncio.ensure_future(self._attempt(
+            session, url, params, host, bucket, latencies, priority, sent))}
+        try:
+            # Ожидание места и токена — не медленный ответ: отсчёт идёт с отправки
+            waiter = asyncio.ensure_future(sent.wait())
+            await asyncio.wait(tasks | {waiter}, return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            # Дубль не берёт токен в долг: иначе он отодвинул бы следующие поиски
+            if not done and bucket.available() >= 1:
+                metrics.count("http_hedged_total", host=host)
+                tasks.add(asyncio.ensure_future(self._attempt(
+                    session, url, params, host, bucket, latencies, priority)))
+            while True:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                results = [task.result() for task in done]
+                for result in results:
+                    if result[1] is None:
+                        return result
+                if not tasks:
+                    return results[0]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _backoff(self, attempt):
+        """Экспоненциальная задержка со случайной добавкой."""
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _retry_after(response):
+    value = response.headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _is_maxlag(data):
+    error = data.get("error") if isinstance(data, dict) else None
+    return isinstance(error, dict) and error.get("code") == "maxlag"
+
+
+# Лимит частоты общий для всех воркеров вебхука, поэтому делится между ними;
+# лимит одновременных запросов действует в каждом процессе
+scheduler = RequestScheduler(
+    rate=config.HTTP_RATE_LIMIT / config.PROCESSES,
+    burst=max(1, config.HTTP_RATE_BURST // config.PROCESSES),
+    concurrency=config.HTTP_CONCURRENCY,
+    reserved=config.HTTP_INTERACTIVE_RESERVE,
+    timeout=config.HTTP_TIMEOUT,
+    retries=config.HTTP_RETRIES,
+    backoff=config.HTTP_BACKOFF,
+    max_backoff=config.HTTP_BACKOFF_MAX,
+    maxlag=config.MAXLAG,
+    hedge_quantile=config.HTTP_HEDGE_QUANTILE,
+)
@@ -0,0 +1,152 @@
+"""Очередь исходящих сообщений бота с учётом лимитов Telegram.
+
+Telegram разрешает боту около 30 сообщений в секунду всего, около одного
+в секунду в личный чат и 20 в минуту в группу; при превышении отвечает
+RetryAfter. SendQueue — middleware сессии бота: через неё проходят все
+вызовы Bot API с chat_id (отправка, правка и удаление сообщений), так
+что обработчики по-прежнему вызывают message.answer и т.п. напрямую.
+
+Очередь у каждого процесса своя, поэтому воркеры вебхука делят общий
+лимит SEND_RATE_LIMIT поровну. Лимиты на чат действуют в каждом
+процессе отдельно.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+from app import config
+from app.metrics import metrics
+from app.scheduler import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты отправки: ответы на поиск идут раньше разделов и пакетов
+URGENT = 0
+DEFERRED = 1
+
+_priority = contextvars.ContextVar("send_priority", default=URGENT)
+
+
+@contextmanager
+def deferred():
+    """Сообщения внутри блока уступают очередь ответам на поиск."""
+    token = _priority.set(DEFERRED)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class SendQueue(BaseRequestMiddleware):
+    """Общий лимит частоты с приоритетами и лимит на каждый чат.
+
+    Сначала сообщение ждёт токен своего чата (по порядку отправки), затем
+    общий токен: его получает самое приоритетное из ожидающих. На RetryAfter
+    чат ставится на паузу, а сообщение отправляется повторно.
+    """
+
+    def __init__(self, rate, burst, chat_rate, chat_burst, group_rate, retries):
+        self.bucket = TokenBucket(rate, burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.retries = retries
+        self._chats = {}  # chat_id -> TokenBucket
+        self._waiters = []  # куча (приоритет, номер, Future)
+        self._counter = itertools.count()
+        self._wakeup = None
+        self._worker = None
+
+    @property
+    def depth(self):
+        return len(self._waiters)
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        name = type(method).__name__
+        started = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            await self._chat_bucket(chat_id).take()
+            await self._acquire(_priority.get())
+            sent = time.perf_counter()
+            metrics.observe("send_wait_seconds", sent - started, method=name)
+            try:
+                response = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == self.retries:
+                    raise
+                metrics.count("send_retry_after_total", method=name)
+                logger.warning("Telegram просит подождать %s с (чат %s)", e.retry_after, chat_id)
+                self._chat_bucket(chat_id).block(e.retry_after)
+                continue
+            metrics.observe("send_seconds", time.perf_counter() - sent, method=name)
+            return response
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10000:
+                self._forget_idle_chats()
+            # Отрицательные id — группы и каналы, у них свой лимит
+            rate = self.group_rate if isinstance(chat_id, int) and chat_id < 0 else self.chat_rate
+            bucket = self._chats[chat_id] = TokenBucket(rate, self.chat_burst)
+        return bucket
+
+    def _forget_idle_chats(self):
+        """Убирает чаты, чей лимит давно восстановился: такое ведро равно новому."""
+        now = time.monotonic()
+        self._chats = {
+            chat_id: bucket for chat_id, bucket in self._chats.items()
+            if bucket.tokens + (now - bucket.updated) * bucket.rate < bucket.capacity
+            or bucket.blocked_until > now}
+
+    async def _acquire(self, priority):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        if self._worker is None or self._worker.done():
+            # Задача и событие привязаны к циклу, в котором бот отправляет
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+        self._wakeup.set()
+        await future
+
+    async def _run(self):
+        """Раздаёт общие токены ожидающим по приоритету."""
+        while True:
+            while not self._waiters:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            await self.bucket.take()
+            # Токен достаётся тому, кто приоритетнее на момент его появления
+            while self._waiters:
+                _, _, future = heapq.heappop(self._waiters)
+                if not future.done():
+                    future.set_result(None)
+                    break
+
+
+def _queue_samples():
+    return [("send_queue_depth", {}, send_queue.depth),
+            ("send_chats", {}, len(send_queue._chats))]
+
+
+send_queue = SendQueue(
+    rate=config.SEND_RATE_LIMIT / config.PROCESSES,
+    burst=max(1, config.SEND_RATE_BURST // config.PROCESSES),
+    chat_rate=config.SEND_CHAT_RATE,
+    chat_burst=config.SEND_CHAT_BURST,
+    group_rate=config.SEND_GROUP_RATE,
+    retries=config.SEND_RETRIES,
+)
+
+metrics.add_collector(_queue_samples, kind="gauge")
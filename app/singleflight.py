@@ -0,0 +1,55 @@
+import asyncio
+
+
+class SingleFlight:
+    """Объединяет одновременные одинаковые запросы в один.
+
+    Пока запрос по ключу выполняется, остальные вызовы с тем же ключом
+    не идут в сеть, а ждут его результат.
+    """
+
+    def __init__(self):
+        self._calls = {}  # ключ -> Future с результатом
+
+    async def do(self, key, func, *args):
+        """Выполняет func(*args) один раз на все одновременные вызовы с key."""
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func(*args))
+            self._calls[key] = future
+            future.add_done_callback(lambda _: self._forget(key, future))
+        # shield: отмена одного ожидающего не отменяет общий запрос
+        return await asyncio.shield(future)
+
+    async def do_many(self, keys, func):
+        """Пакетный вариант do.
+
+        func получает список ключей, которые ещё никто не запрашивает,
+        и возвращает словарь ключ -> значение. Ключи, уже находящиеся
+        в работе, дожидаются чужих запросов. Ключи без значения
+        в результат не попадают.
+        """
+        loop = asyncio.get_running_loop()
+        waiting = {key: self._calls[key] for key in keys if key in self._calls}
+        own = {key: loop.create_future() for key in keys if key not in waiting}
+        self._calls.update(own)
+
+        results = {}
+        try:
+            if own:
+                results.update(await func(list(own)))
+        finally:
+            for key, future in own.items():
+                self._forget(key, future)
+                if not future.done():
+                    future.set_result(results.get(key))
+
+        for key, future in waiting.items():
+            value = await asyncio.shield(future)
+            if value is not None:
+                results[key] = value
+        return results
+
+    def _forget(self, key, future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
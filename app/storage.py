@@ -0,0 +1,108 @@
+import json
+import sqlite3
+from dataclasses import replace
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from app import config
+from app.metrics import metrics
+
+SETTINGS_DESTINY = "settings"
+
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище FSM в файле SQLite.
+
+    Файл можно открыть из нескольких процессов, поэтому состояние
+    пользователя видно любому воркеру вебхука.
+    """
+
+    def __init__(self, path):
+        self._key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS fsm ("
+            " key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL DEFAULT '{}')")
+        self._db.commit()
+
+    async def set_state(self, key, state=None):
+        state = state.state if isinstance(state, State) else state
+        self._db.execute(
+            "INSERT INTO fsm (key, state) VALUES (?, ?)"
+            " ON CONFLICT (key) DO UPDATE SET state = excluded.state",
+            (self._key_builder.build(key), state))
+        self._db.commit()
+
+    async def get_state(self, key):
+        row = self._db.execute("SELECT state FROM fsm WHERE key = ?",
+                               (self._key_builder.build(key),)).fetchone()
+        return row[0] if row else None
+
+    async def set_data(self, key, data):
+        self._db.execute(
+            "INSERT INTO fsm (key, data) VALUES (?, ?)"
+            " ON CONFLICT (key) DO UPDATE SET data = excluded.data",
+            (self._key_builder.build(key), json.dumps(data, ensure_ascii=False)))
+        self._db.commit()
+
+    async def get_data(self, key):
+        row = self._db.execute("SELECT data FROM fsm WHERE key = ?",
+                               (self._key_builder.build(key),)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    async def close(self):
+        self._db.close()
+
+
+class TimedStorage(BaseStorage):
+    """Обёртка над хранилищем FSM, замеряющая время обращений к нему."""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    async def set_state(self, key, state=None):
+        with metrics.span("fsm_set_state"):
+            await self.storage.set_state(key, state)
+
+    async def get_state(self, key):
+        with metrics.span("fsm_get_state"):
+            return await self.storage.get_state(key)
+
+    async def set_data(self, key, data):
+        with metrics.span("fsm_set_data"):
+            await self.storage.set_data(key, data)
+
+    async def get_data(self, key):
+        with metrics.span("fsm_get_data"):
+            return await self.storage.get_data(key)
+
+    async def close(self):
+        await self.storage.close()
+
+
+def settings_key(key):
+    """Ключ настроек пользователя по ключу FSM.
+
+    Настройки общие для всех чатов пользователя (и inline-режима)
+    и не стираются state.clear(): у них свой destiny.
+    """
+    return replace(key, chat_id=key.user_id, thread_id=None,
+                   business_connection_id=None, destiny=SETTINGS_DESTINY)
+
+
+def create_fsm_storage():
+    """Хранилище FSM по настройке FSM_STORAGE: memory, sqlite или redis."""
+    if config.FSM_STORAGE == 'sqlite':
+        storage = SQLiteStorage(config.FSM_STORAGE_PATH)
+    elif config.FSM_STORAGE == 'redis':
+        # Нужен пакет redis: pip install redis
+        from aiogram.fsm.storage.redis import RedisStorage
+        storage = RedisStorage.from_url(config.REDIS_URL)
+    else:
+        storage = MemoryStorage()
+    return TimedStorage(storage)
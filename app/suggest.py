@@ -0,0 +1,175 @@
+"""Подсказки названий для inline-режима и «возможно, вы имели в виду».
+
+Сначала ищем без сети: в индексе уже найденных личностей и в локальном
+индексе дампа. Ответы prefixsearch хранятся несколько минут; если
+ответ на короткий префикс полон (у API нет продолжения), подсказки
+для его продолжений получаются фильтрацией, без запроса.
+"""
+import asyncio
+import bisect
+import logging
+import time
+from collections import OrderedDict
+
+from app import config
+from app.local_index import local_index, title_key
+from app.metrics import metrics
+from app.MWAPI import entity_term, search_titles
+from app.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class PrefixIndex:
+    """Отсортированный массив ключей названий с поиском по префиксу.
+
+    Ключ — title_key названия или запроса, по которому личность нашли.
+    При переполнении удаляются ключи, добавленные раньше всех.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._keys = []  # отсортированные ключи
+        self._entries = OrderedDict()  # ключ -> подсказка, в порядке добавления
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, name, entry):
+        key = title_key(name)
+        if not key:
+            return
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        else:
+            bisect.insort(self._keys, key)
+        self._entries[key] = entry
+        if len(self._entries) > self.max_size:
+            old, _ = self._entries.popitem(last=False)
+            del self._keys[bisect.bisect_left(self._keys, old)]
+
+    def search(self, prefix, limit):
+        key = title_key(prefix)
+        found = {}
+        i = bisect.bisect_left(self._keys, key)
+        while i < len(self._keys) and self._keys[i].startswith(key) and len(found) < limit:
+            entry = self._entries[self._keys[i]]
+            found.setdefault(entry["title"], entry)
+            i += 1
+        return list(found.values())
+
+
+class Suggester:
+    def __init__(self, limit, ttl, debounce, index_size):
+        self.limit = limit
+        self.ttl = ttl
+        self.debounce_delay = debounce
+        self.index = PrefixIndex(index_size)
+        self._results = {}  # (ключ префикса, fuzzy) -> (истекает, подсказки, полон ли)
+        self._flight = SingleFlight()
+        self._latest = {}  # пользователь -> маркер последнего запроса
+
+    def remember(self, query, info):
+        """Добавляет найденную личность; query — запрос, по которому её нашли."""
+        entry = {
+            "title": info.get("wikipedia_title") or info["full_name"],
+            "description": info.get("description") or "",
+            "wikidata_id": info.get("wikidata_id"),
+            "image_url": info.get("image_url"),
+        }
+        self.index.add(entry["title"], entry)
+        if query:
+            self.index.add(query, entry)
+
+    def local(self, prefix, limit=None):
+        """Подсказки без сетевых запросов."""
+        limit = limit or self.limit
+        found = {entry["title"]: entry for entry in self.index.search(prefix, limit)}
+        if len(found) < limit:
+            for entry in _local_index_entries(prefix, limit):
+                found.setdefault(entry["title"], entry)
+        return list(found.values())[:limit]
+
+    async def suggest(self, prefix, limit=None, fuzzy=False):
+        """Подсказки: сначала локальные, затем prefixsearch (из кэша, если есть)."""
+        limit = limit or self.limit
+        found = {} if fuzzy else {entry["title"]: entry
+                                  for entry in self.local(prefix, limit)}
+        if len(found) < limit:
+            for entry in await self._search(prefix, fuzzy):
+                found.setdefault(entry["title"], entry)
+        return list(found.values())[:limit]
+
+    async def debounce(self, user_id):
+        """Ждёт паузу в наборе; False, если за это время пришёл новый запрос."""
+        marker = object()
+        self._latest[user_id] = marker
+        await asyncio.sleep(self.debounce_delay)
+        if self._latest.get(user_id) is not marker:
+            metrics.count("suggest_debounced_total")
+            return False
+        del self._latest[user_id]
+        return True
+
+    async def _search(self, prefix, fuzzy):
+        key = title_key(prefix)
+        cached = self._cached(key, fuzzy)
+        if cached is not None:
+            metrics.count("suggest_cache_total", result="hit")
+            return cached
+        metrics.count("suggest_cache_total", result="miss")
+        return await self._flight.do((key, fuzzy), self._load, prefix, key, fuzzy)
+
+    def _cached(self, key, fuzzy):
+        now = time.monotonic()
+        hit = self._results.get((key, fuzzy))
+        if hit is not None and hit[0] > now:
+            return hit[1]
+        if fuzzy:
+            return None
+        # Полный ответ на более короткий префикс содержит все продолжения
+        for end in range(len(key) - 1, 0, -1):
+            hit = self._results.get((key[:end], False))
+            if hit is not None and hit[0] > now and hit[2]:
+                return [entry for entry in hit[1]
+                        if title_key(entry["title"]).startswith(key)]
+        return None
+
+    async def _load(self, prefix, key, fuzzy):
+        try:
+            results, complete = await search_titles(prefix, self.limit, fuzzy)
+        except Exception as e:
+            logger.warning("Не удалось получить подсказки для %r: %r", prefix, e)
+            return []
+        now = time.monotonic()
+        if len(self._results) > 10000:
+            self._results = {k: v for k, v in self._results.items() if v[0] > now}
+        self._results[(key, fuzzy)] = (now + self.ttl, results, complete)
+        return results
+
+
+def _local_index_entries(prefix, limit):
+    entries = []
+    for qid in local_index.search(prefix, limit):
+        entity = local_index.get_entity(qid)
+        sitelink = entity.get("sitelinks", {}).get("ruwiki")
+        label = entity_term(entity, "labels")
+        if not (sitelink or label):
+            continue
+        entries.append({
+            "title": sitelink["title"] if sitelink else label,
+            "description": entity_term(entity, "descriptions") or "",
+            "wikidata_id": qid,
+            "image_url": None,
+        })
+    if entries:
+        metrics.count("local_index_hits_total", kind="suggest")
+    return entries
+
+
+suggester = Suggester(
+    limit=config.SUGGEST_LIMIT,
+    ttl=config.SUGGEST_CACHE_TTL,
+    debounce=config.SUGGEST_DEBOUNCE,
+    index_size=config.SUGGEST_INDEX_SIZE,
+)
@@ -0,0 +1,175 @@
+"""Прогрев кэша при запуске и фоновая загрузка связанных личностей.
+
+Всё здесь выполняется как фоновые запросы (scheduler.background):
+они уступают места и токены частоты пользовательским поискам.
+"""
+import asyncio
+import logging
+import sqlite3
+import time
+from pathlib import Path
+
+from app import config
+from app.metrics import metrics
+from app.MWAPI import (SECTION_PROPERTIES, WBGETENTITIES_LIMIT, collect_item_ids,
+                       get_people_info, get_wikidata_infos, get_wikidata_labels,
+                       get_wikipedia_pages)
+from app.photos import photo_store
+from app.scheduler import background
+
+logger = logging.getLogger(__name__)
+
+# Свойства, по которым пользователи чаще всего переходят к следующей личности
+RELATED_PROPERTIES = ("P40",)  # дети
+
+_SECTION_IDS = frozenset().union(*SECTION_PROPERTIES.values())
+
+
+class QueryLog:
+    """Сколько раз находили каждую личность; хранится в файле кэша.
+
+    Счётчики копятся в памяти и записываются пачками, так что запись
+    в журнал не добавляет обращений к диску на каждый поиск.
+    """
+
+    def __init__(self, path, flush_every=50):
+        self.path = path
+        self.flush_every = flush_every
+        self._db = None
+        self._pending = {}  # Q-id -> найдено раз с последней записи
+
+    def open(self):
+        if self._db is not None:
+            return
+        self._db = sqlite3.connect(self.path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS query_log ("
+            " qid TEXT PRIMARY KEY, count INTEGER NOT NULL, last_at REAL NOT NULL)")
+        self._db.commit()
+
+    def close(self):
+        if self._db is not None:
+            self.flush()
+            self._db.close()
+            self._db = None
+
+    def add(self, wikidata_id):
+        if self._db is None:
+            return
+        self._pending[wikidata_id] = self._pending.get(wikidata_id, 0) + 1
+        if sum(self._pending.values()) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if self._db is None or not self._pending:
+            return
+        now = time.time()
+        self._db.executemany(
+            "INSERT INTO query_log VALUES (?, ?, ?) ON CONFLICT (qid) DO UPDATE"
+            " SET count = count + excluded.count, last_at = excluded.last_at",
+            [(qid, count, now) for qid, count in self._pending.items()])
+        self._db.commit()
+        self._pending.clear()
+
+    def popular(self, limit):
+        """Q-id самых часто находимых личностей."""
+        if self._db is None or not limit:
+            return []
+        self.flush()
+        rows = self._db.execute(
+            "SELECT qid FROM query_log ORDER BY count DESC, last_at DESC LIMIT ?",
+            (limit,))
+        return [qid for qid, in rows]
+
+
+async def warm_up():
+    """Загружает в кэш популярных по журналу личностей и имена из WARMUP_NAMES.
+
+    Вместе с карточками загружаются названия для всех разделов, поэтому
+    первые нажатия на кнопки разделов тоже не идут в сеть.
+    """
+    wikidata_ids = query_log.popular(config.WARMUP_SIZE)
+    names = _read_names(config.WARMUP_NAMES) if config.WARMUP_NAMES else []
+    if not wikidata_ids and not names:
+        return
+
+    semaphore = asyncio.Semaphore(config.WARMUP_CONCURRENCY)
+
+    async def load(chunk, by_name):
+        async with semaphore:
+            if by_name:
+                infos = await get_people_info(chunk)
+            else:
+                infos = await get_wikidata_infos(chunk)
+            found = [info for info in infos.values() if "error" not in info]
+            await get_wikidata_labels(
+                [item_id for info in found
+                 for item_id in collect_item_ids(info.get("claims") or {}, _SECTION_IDS)])
+            return len(found)
+
+    started = time.monotonic()
+    chunks = ([(wikidata_ids[i:i + WBGETENTITIES_LIMIT], False)
+               for i in range(0, len(wikidata_ids), WBGETENTITIES_LIMIT)]
+              + [(names[i:i + WBGETENTITIES_LIMIT], True)
+                 for i in range(0, len(names), WBGETENTITIES_LIMIT)])
+    with background(), metrics.span("warmup"):
+        try:
+            loaded = await asyncio.wait_for(
+                asyncio.gather(*(load(chunk, by_name) for chunk, by_name in chunks)),
+                config.WARMUP_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Прогрев кэша прерван через %s с", config.WARMUP_TIMEOUT)
+            return
+    logger.info("Кэш прогрет: %d личностей за %.1f с",
+                sum(loaded), time.monotonic() - started)
+
+
+def _read_names(path):
+    try:
+        lines = Path(path).read_text(encoding="utf-8").splitlines()
+    except OSError as e:
+        logger.warning("Не удалось прочитать WARMUP_NAMES: %r", e)
+        return []
+    return list(dict.fromkeys(line.strip() for line in lines
+                              if line.strip() and not line.startswith("#")))
+
+
+class Prefetcher:
+    """Фоновая загрузка личностей, которых откроют следом за показанной,
+    и их фото (если Telegram их ещё не видел).
+
+    Одновременно выполняется не больше max_tasks загрузок; если все места
+    заняты, новая загрузка просто пропускается.
+    """
+
+    def __init__(self, max_tasks):
+        self.max_tasks = max_tasks
+        self._tasks = set()
+
+    def person_shown(self, info):
+        related = collect_item_ids(info.get("claims") or {}, RELATED_PROPERTIES)
+        if not related or len(self._tasks) >= self.max_tasks:
+            return
+        # Задача наследует фоновый приоритет из контекста, в котором создана
+        with background():
+            task = asyncio.create_task(self._load(related))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _load(self, wikidata_ids):
+        try:
+            with metrics.span("prefetch"):
+                infos = await get_wikidata_infos(wikidata_ids)
+                # Фото карточки — миниатюра статьи, как в get_wikipedia_page
+                titles = [info["wikipedia_title"] for info in infos.values()
+                          if info.get("wikipedia_title")]
+                pages = await get_wikipedia_pages(titles) if titles else {}
+            metrics.count("prefetched_total", len(wikidata_ids))
+            for page in pages.values():
+                photo_store.prefetch(page.get("image_url"))
+        except Exception as e:
+            logger.info("Фоновая загрузка не удалась: %r", e)
+
+
+query_log = QueryLog(config.CACHE_PATH)
+prefetcher = Prefetcher(config.PREFETCH_TASKS)
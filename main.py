@@ -1,26 +1,149 @@
 import os
-from pathlib import Path
+import logging
+import multiprocessing
 from dotenv import load_dotenv
 import asyncio
+from aiohttp import web
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
 from app.handlers import router
-
-TEMP_PHOTOS_DIR = Path("temp_photos")
-TEMP_PHOTOS_DIR.mkdir(exist_ok=True)
+from app import MWAPI, config
+from app.cache import cache
+from app.local_index import local_index
+from app.metrics import log_metrics, start_metrics_server
+from app.middlewares import LanguageMiddleware, MetricsMiddleware
+from app.sender import send_queue
+from app.storage import create_fsm_storage
+from app.warmup import query_log, warm_up
 
 load_dotenv()
 
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 
-async def main():
-    bot = Bot(token=BOT_TOKEN)
-    dp = Dispatcher(bot=bot)
+logger = logging.getLogger(__name__)
+
+_metrics_runner = None
+_metrics_log_task = None
+_worker_index = 0  # номер воркера вебхука; порт метрик — METRICS_PORT + номер
+
+
+async def on_startup():
+    global _metrics_runner, _metrics_log_task
+    cache.open()
+    local_index.open()
+    query_log.open()
+    await MWAPI.open_session()
+    # До начала приёма обновлений, но не дольше WARMUP_TIMEOUT. Кэш на диске
+    # общий, поэтому воркеры вебхука не повторяют прогрев за первым
+    if _worker_index == 0:
+        await warm_up()
+    if config.METRICS_PORT:
+        _metrics_runner = await start_metrics_server(config.METRICS_PORT + _worker_index)
+    if config.METRICS_LOG_INTERVAL:
+        _metrics_log_task = asyncio.create_task(log_metrics(config.METRICS_LOG_INTERVAL))
+
+
+async def on_shutdown():
+    if _metrics_log_task is not None:
+        _metrics_log_task.cancel()
+    if _metrics_runner is not None:
+        await _metrics_runner.cleanup()
+    await MWAPI.close_session()
+    query_log.close()
+    local_index.close()
+    cache.close()
+
+
+def create_bot():
+    if config.TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(config.TELEGRAM_API_URL))
+    else:
+        session = AiohttpSession()
+    # Все отправки идут через общую очередь с лимитами Telegram
+    session.middleware(send_queue)
+    return Bot(token=BOT_TOKEN, session=session)
+
+
+def create_dispatcher(bot):
+    dp = Dispatcher(bot=bot, storage=create_fsm_storage())
     dp.include_router(router)
+    # Внутренние middleware: в данных уже есть обработчик, время меряется по нему
+    dp.message.middleware(MetricsMiddleware())
+    dp.callback_query.middleware(MetricsMiddleware())
+    dp.inline_query.middleware(MetricsMiddleware())
+    for observer in (dp.message, dp.callback_query, dp.inline_query):
+        observer.middleware(LanguageMiddleware())
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    return dp
+
+
+async def main():
+    bot = create_bot()
+    dp = create_dispatcher(bot)
+    await bot.delete_webhook()
     await dp.start_polling(bot)
 
+
+async def set_webhook():
+    """Регистрирует вебхук в Telegram (один раз, до запуска воркеров)."""
+    bot = create_bot()
+    async with bot.session:
+        await bot.set_webhook(config.WEBHOOK_URL + config.WEBHOOK_PATH,
+                              secret_token=config.WEBHOOK_SECRET,
+                              drop_pending_updates=False)
+
+
+def run_webhook_worker(index=0):
+    """Один процесс: aiohttp-сервер, принимающий обновления от Telegram."""
+    global _worker_index
+    _worker_index = index
+    bot = create_bot()
+    dp = create_dispatcher(bot)
+
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot,
+                         secret_token=config.WEBHOOK_SECRET).register(app, path=config.WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    # reuse_port: все воркеры слушают один порт, ядро распределяет соединения
+    web.run_app(app, host=config.WEBHOOK_HOST, port=config.WEBHOOK_PORT,
+                reuse_port=config.WEBHOOK_WORKERS > 1, print=None)
+
+
+def run_webhook():
+    # Проверка до регистрации: иначе Telegram слал бы обновления незапущенному серверу
+    if config.WEBHOOK_WORKERS > 1 and config.FSM_STORAGE == 'memory':
+        raise SystemExit('Для WEBHOOK_WORKERS > 1 нужно общее хранилище: '
+                         'FSM_STORAGE=sqlite или FSM_STORAGE=redis')
+    if config.WEBHOOK_URL:
+        asyncio.run(set_webhook())
+
+    if config.WEBHOOK_WORKERS == 1:
+        run_webhook_worker()
+        return
+
+    workers = [multiprocessing.Process(target=run_webhook_worker, args=(index,))
+               for index in range(config.WEBHOOK_WORKERS)]
+    for worker in workers:
+        worker.start()
+    logger.info('Запущено воркеров: %d', len(workers))
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.join()
+
+
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     try:
-        asyncio.run(main())
+        if config.BOT_MODE == 'webhook':
+            run_webhook()
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         print("Bot OFF")
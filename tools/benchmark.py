@@ -0,0 +1,322 @@
+"""Бенчмарк поиска личностей на поддельных API Wikimedia и Telegram.
+
+Запускает tools/fake_wikimedia.py и поддельный Bot API в отдельном
+процессе, направляет на них бота и прогоняет поиски от нескольких
+одновременных пользователей: напрямую через get_person_info (api)
+и через обработчики app/handlers.py (bot). Печатает p50/p95/p99
+задержек, число запросов к API на один поиск, процессорное время и
+пиковую память процесса бота.
+
+    python tools/benchmark.py --users 20 --lookups 500 --latency 0.05
+    python tools/benchmark.py --mode bot --sections --error-rate 0.02 --warm
+
+Записать корпус настоящих ответов для имён из tools/names.txt
+(нужен доступ в интернет; запросы идут с обычными лимитами бота):
+
+    python tools/benchmark.py --record --names tools/names.txt
+"""
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from aiohttp import ClientSession, web
+
+from fake_telegram import FakeBotAPI, make_callback_update, make_message_update
+from fake_wikimedia import add_arguments, create_server
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SECTIONS = {
+    "demographic data": "demographic",
+    "geographical information": "geographical",
+    "professional activity": "professional",
+    "political-organizational affiliation": "political",
+}
+
+
+def run_servers(args, ready):
+    """Дочерний процесс: поддельные Wikimedia и Bot API на своих портах."""
+    async def serve():
+        runners = []
+        for app, port in ((create_server(args).make_app(), args.port),
+                          (_bot_api_app(), args.port + 1)):
+            runner = web.AppRunner(app)
+            await runner.setup()
+            await web.TCPSite(runner, "127.0.0.1", port).start()
+            runners.append(runner)
+        ready.set()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            for runner in runners:
+                await runner.cleanup()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+def _bot_api_app():
+    api = FakeBotAPI()
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", api.handle)
+    app.router.add_get("/stats", lambda request: web.json_response(dict(api.calls)))
+    return app
+
+
+def configure(args, cache_path):
+    """Переменные окружения бота; читаются при импорте app.config."""
+    base = f"http://127.0.0.1:{args.port}"
+    os.environ["WIKIPEDIA_API_URL"] = f"{base}/wikipedia/w/api.php"
+    os.environ["WIKIDATA_API_URL"] = f"{base}/wikidata/w/api.php"
+    os.environ["CACHE_PATH"] = cache_path
+    os.environ["LOCAL_INDEX_PATH"] = args.local_index or ""
+    if not args.record:
+        # Лимит частоты Wikimedia измерял бы сам себя, а не код бота;
+        # его можно вернуть, задав HTTP_RATE_LIMIT явно
+        os.environ.setdefault("HTTP_RATE_LIMIT", "100000")
+        os.environ.setdefault("HTTP_RATE_BURST", "100000")
+        os.environ.setdefault("CARD_EDIT_INTERVAL", "0")
+        # Все сообщения бенчмарка уходят в несколько чатов, а фальшивый
+        # Bot API лимитов не знает
+        os.environ.setdefault("SEND_RATE_LIMIT", "100000")
+        os.environ.setdefault("SEND_RATE_BURST", "100000")
+        os.environ.setdefault("SEND_CHAT_RATE", "100000")
+        os.environ.setdefault("SEND_CHAT_BURST", "100000")
+    sys.path.insert(0, str(ROOT))
+
+
+def percentile(values, percent):
+    """Процентиль по ближайшему рангу."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, -(-len(ordered) * percent // 100) - 1)]
+
+
+class Run:
+    """Замеры одного прогона по стадиям (поиск, раздел)."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = Counter()
+
+    def add(self, stage, seconds, error=False):
+        self.latencies.setdefault(stage, []).append(seconds)
+        if error:
+            self.errors[stage] += 1
+
+
+async def lookup_api(run, name, sections):
+    from app.MWAPI import Person, get_person_info, load_section
+
+    started = time.perf_counter()
+    info = await get_person_info(name)
+    run.add("lookup", time.perf_counter() - started, "error" in info)
+    if sections and "error" not in info:
+        person = Person.from_info(info)
+        for section in SECTIONS.values():
+            started = time.perf_counter()
+            person = await load_section(person, section)
+            run.add("section", time.perf_counter() - started)
+
+
+async def lookup_bot(run, name, sections, dp, bot, user_id, update_ids):
+    from aiogram.fsm.storage.base import StorageKey
+    from aiogram.types import Update
+
+    from app.handlers import UserInput
+
+    async def feed(update):
+        await dp.feed_update(bot, Update.model_validate(update, context={"bot": bot}))
+
+    await feed(make_message_update(next(update_ids), user_id, "/find"))
+    started = time.perf_counter()
+    await feed(make_message_update(next(update_ids), user_id, name))
+    # Карточка отправлена, только если поиск дошёл до выбора раздела
+    state = await dp.storage.get_state(StorageKey(bot.id, user_id, user_id))
+    found = state == UserInput.current_person.state
+    run.add("lookup", time.perf_counter() - started, not found)
+    if sections and found:
+        for data in SECTIONS:
+            started = time.perf_counter()
+            await feed(make_callback_update(next(update_ids), user_id, data))
+            run.add("section", time.perf_counter() - started)
+
+
+async def run_pass(names, lookups, users, sections, mode, dp, bot):
+    run = Run()
+    queue = iter(itertools.islice(itertools.cycle(names), lookups))
+    update_ids = itertools.count(1)
+
+    async def user(user_id):
+        for name in queue:
+            if mode == "api":
+                await lookup_api(run, name, sections)
+            else:
+                await lookup_bot(run, name, sections, dp, bot, user_id, update_ids)
+
+    await asyncio.gather(*(user(1000 + i) for i in range(users)))
+    return run
+
+
+async def fetch_stats(session, url, reset=False):
+    async with session.get(url + "/stats") as response:
+        stats = await response.json()
+    if reset:
+        async with session.post(url + "/stats/reset"):
+            pass
+    return stats
+
+
+def report(title, run, lookups, wall, cpu, requests, bot_calls, baseline):
+    print(f"\n== {title}: {lookups} поисков за {wall:.2f} с "
+          f"({lookups / wall:.1f} в секунду)")
+    for stage, values in run.latencies.items():
+        print(f"  {stage:8} n={len(values):<5} ошибок={run.errors[stage]:<4}"
+              f" p50={percentile(values, 50) * 1000:8.1f} мс"
+              f"  p95={percentile(values, 95) * 1000:8.1f} мс"
+              f"  p99={percentile(values, 99) * 1000:8.1f} мс"
+              f"  max={max(values) * 1000:8.1f} мс")
+    total = sum(count for key, count in requests.items() if key != "errors")
+    print(f"  запросов к API: {total} ({total / lookups:.2f} на поиск), "
+          f"ответов с ошибкой: {requests.get('errors', 0)}")
+    for key, count in sorted(requests.items()):
+        if key != "errors":
+            print(f"    {key}: {count} ({count / lookups:.2f} на поиск)")
+    if bot_calls:
+        print(f"  вызовы Bot API: {dict(bot_calls)}")
+    print(f"  процессорное время: {cpu:.2f} с ({cpu / lookups * 1000:.2f} мс на поиск)")
+    print(f"  пиковая память процесса: {peak_memory():.1f} МБ"
+          f" (после запуска {baseline:.1f} МБ)")
+
+
+def peak_memory():
+    """Пиковый RSS процесса, МБ (на Linux ru_maxrss — в килобайтах)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+async def main(args, names):
+    from aiogram import Bot, Dispatcher
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from aiogram.fsm.storage.memory import MemoryStorage
+
+    from app import MWAPI
+    from app.cache import cache
+    from app.handlers import router
+    from app.local_index import local_index
+    from app.metrics import metrics
+    from app.middlewares import LanguageMiddleware, MetricsMiddleware
+    from app.sender import send_queue
+
+    cache.open()
+    local_index.open()
+    await MWAPI.open_session()
+    wikimedia = f"http://127.0.0.1:{args.port}"
+    telegram = f"http://127.0.0.1:{args.port + 1}"
+    bot_session = AiohttpSession(api=TelegramAPIServer.from_base(telegram))
+    bot_session.middleware(send_queue)
+    bot = Bot("123456:TEST", session=bot_session)
+    dp = Dispatcher(storage=MemoryStorage())
+    dp.include_router(router)
+    dp.message.middleware(MetricsMiddleware())
+    dp.callback_query.middleware(MetricsMiddleware())
+    dp.inline_query.middleware(MetricsMiddleware())
+    for observer in (dp.message, dp.callback_query, dp.inline_query):
+        observer.middleware(LanguageMiddleware())
+    baseline = peak_memory()
+    modes = ["api", "bot"] if args.mode == "both" else [args.mode]
+    async with ClientSession() as session:
+        if not names:
+            # Корпус загружен только в процессе сервера
+            async with session.get(wikimedia + "/queries") as response:
+                names = await response.json()
+        lookups = args.lookups or len(names)
+        for mode in modes:
+            for warm in (False, True) if args.warm else (False,):
+                if not warm:
+                    cache.clear()
+                await fetch_stats(session, wikimedia, reset=True)
+                bot_before = Counter(await fetch_stats(session, telegram))
+                started, cpu = time.perf_counter(), cpu_time()
+
+                run = await run_pass(names, lookups, args.users, args.sections,
+                                     mode, dp, bot)
+
+                wall, cpu = time.perf_counter() - started, cpu_time() - cpu
+                requests = await fetch_stats(session, wikimedia)
+                bot_calls = Counter(await fetch_stats(session, telegram)) - bot_before
+                report(f"{mode}, {'тёплый' if warm else 'холодный'} кэш",
+                       run, lookups, wall, cpu, requests, bot_calls, baseline)
+        if args.metrics:
+            print("\n" + metrics.render())
+        if args.record:
+            async with session.post(wikimedia + "/save") as response:
+                print("Корпус записан:", await response.json(), args.fixtures)
+
+    await bot.session.close()
+    await MWAPI.close_session()
+    local_index.close()
+    cache.close()
+
+
+def read_names(path):
+    lines = Path(path).read_text(encoding="utf-8").splitlines()
+    return [line.strip() for line in lines
+            if line.strip() and not line.startswith("#")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765,
+                        help="порт поддельной Wikimedia; Bot API — на следующем")
+    parser.add_argument("--mode", choices=["api", "bot", "both"], default="both")
+    parser.add_argument("--users", type=int, default=20,
+                        help="одновременных пользователей")
+    parser.add_argument("--lookups", type=int, default=None,
+                        help="поисков за прогон (по умолчанию — по одному на имя)")
+    parser.add_argument("--names", default=None,
+                        help="файл с именами, по одному в строке (по умолчанию — имена корпуса)")
+    parser.add_argument("--sections", action="store_true",
+                        help="после поиска открывать все четыре раздела")
+    parser.add_argument("--warm", action="store_true",
+                        help="повторить прогон с заполненным кэшем")
+    parser.add_argument("--metrics", action="store_true",
+                        help="в конце напечатать метрики бота (app/metrics.py)")
+    parser.add_argument("--local-index", default=None,
+                        help="файл локального индекса (по умолчанию не используется)")
+    add_arguments(parser)
+    args = parser.parse_args()
+    if args.record:
+        args.mode, args.sections, args.warm = "api", True, False
+        args.users = min(args.users, 4)
+
+    names = read_names(args.names) if args.names else None
+
+    ready = multiprocessing.Event()
+    servers = multiprocessing.Process(target=run_servers, args=(args, ready),
+                                      daemon=True)
+    servers.start()
+    ready.wait()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            configure(args, os.path.join(directory, "cache.sqlite3"))
+            asyncio.run(main(args, names))
+    finally:
+        servers.terminate()
+        servers.join()
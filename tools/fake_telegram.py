@@ -0,0 +1,138 @@
+"""Локальная проверка бота в режиме webhook без настоящего Telegram.
+
+Поднимает поддельный Bot API сервер, который принимает ответы бота,
+и отправляет на вебхук бота обновления от нескольких пользователей.
+
+    TELEGRAM_API_URL=http://127.0.0.1:8081 BOT_TOKEN=123456:TEST \\
+        BOT_MODE=webhook python main.py
+    python tools/fake_telegram.py --users 20 --name "Пушкин, Александр Сергеевич"
+"""
+import argparse
+import asyncio
+import itertools
+import time
+from collections import Counter
+
+from aiohttp import ClientSession, web
+
+# Методы, которые возвращают отправленное или изменённое сообщение
+MESSAGE_METHODS = {"sendmessage", "sendphoto", "editmessagetext",
+                   "editmessagecaption"}
+
+
+class FakeBotAPI:
+    """Поддельный Bot API: запоминает вызовы и отвечает правдоподобно."""
+
+    def __init__(self):
+        self.calls = Counter()
+        self.replies = Counter()  # chat_id -> число сообщений от бота
+        self._message_ids = itertools.count(1)
+
+    async def handle(self, request):
+        method = request.match_info["method"].lower()
+        form = await request.post()
+        self.calls[method] += 1
+
+        if method == "getme":
+            result = {"id": 123456, "is_bot": True, "first_name": "Fake",
+                      "username": "fake_bot"}
+        elif method in MESSAGE_METHODS:
+            chat_id = int(form.get("chat_id", 0))
+            self.replies[chat_id] += 1
+            result = {"message_id": int(form.get("message_id") or next(self._message_ids)),
+                      "date": int(time.time()),
+                      "chat": {"id": chat_id, "type": "private"}}
+            if method in ("sendphoto", "editmessagecaption"):
+                result["caption"] = form.get("caption", "")
+                result["photo"] = [{"file_id": "fake", "file_unique_id": "fake",
+                                    "width": 1, "height": 1}]
+            else:
+                result["text"] = form.get("text", "")
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+
+def make_message_update(update_id, user_id, text):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"},
+            "text": text,
+            **({"entities": [{"type": "bot_command", "offset": 0,
+                              "length": len(text)}]} if text.startswith("/") else {}),
+        },
+    }
+
+
+def make_callback_update(update_id, user_id, data):
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"},
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {"message_id": update_id, "date": int(time.time()),
+                        "chat": {"id": user_id, "type": "private"}, "text": "card"},
+        },
+    }
+
+
+async def simulate_user(session, args, user_id, update_ids):
+    """Один пользователь: /find, имя, затем кнопка раздела."""
+    headers = {}
+    if args.secret:
+        headers["X-Telegram-Bot-Api-Secret-Token"] = args.secret
+    updates = [
+        make_message_update(next(update_ids), user_id, "/find"),
+        make_message_update(next(update_ids), user_id, args.name),
+        make_callback_update(next(update_ids), user_id, "demographic data"),
+    ]
+    started = time.monotonic()
+    for update in updates:
+        async with session.post(args.webhook, json=update, headers=headers) as response:
+            response.raise_for_status()
+        # Обновления обрабатываются в фоне: даём боту дойти до нужного состояния
+        await asyncio.sleep(args.pause)
+    return time.monotonic() - started
+
+
+async def main(args):
+    api = FakeBotAPI()
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", api.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+
+    update_ids = itertools.count(1)
+    async with ClientSession() as session:
+        durations = await asyncio.gather(*(
+            simulate_user(session, args, 1000 + user, update_ids)
+            for user in range(args.users)))
+    # Бот может отвечать уже после ответа на вебхук
+    await asyncio.sleep(args.wait)
+    await runner.cleanup()
+
+    print(f"Пользователей: {args.users}, "
+          f"среднее время сценария: {sum(durations) / len(durations):.3f} с")
+    print("Вызовы Bot API:", dict(api.calls))
+    print("Пользователей, получивших ответы:", len(api.replies))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--webhook", default="http://127.0.0.1:8080/webhook")
+    parser.add_argument("--port", type=int, default=8081, help="порт поддельного Bot API")
+    parser.add_argument("--secret", default=None, help="WEBHOOK_SECRET бота")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--name", default="Пушкин, Александр Сергеевич")
+    parser.add_argument("--pause", type=float, default=1.0,
+                        help="пауза между сообщениями одного пользователя, с")
+    parser.add_argument("--wait", type=float, default=2.0,
+                        help="сколько секунд ждать ответов после отправки")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,314 @@
+"""Поддельный сервер API Википедии и Викиданных для бенчмарков и отладки.
+
+Отдаёт записанные ответы action=query и wbgetentities (или синтетический
+корпус) с настраиваемой задержкой и долей ошибок. В режиме --record
+работает прокси к настоящим API и записывает их ответы в корпус.
+
+    python tools/fake_wikimedia.py --fixtures tools/fixtures/wikimedia.json.gz \\
+        --latency 0.1 --error-rate 0.02
+    WIKIPEDIA_API_URL=http://127.0.0.1:8765/wikipedia/w/api.php \\
+        WIKIDATA_API_URL=http://127.0.0.1:8765/wikidata/w/api.php python main.py
+
+GET /queries — имена из корпуса, GET /stats — число запросов по видам, POST /stats/reset — обнуление,
+POST /save — запись корпуса (в режиме --record).
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import random
+from collections import Counter
+from pathlib import Path
+
+from aiohttp import ClientSession, web
+
+DEFAULT_FIXTURES = Path(__file__).parent / "fixtures" / "wikimedia.json.gz"
+
+UPSTREAMS = {
+    "wikipedia": "https://ru.wikipedia.org/w/api.php",
+    "wikidata": "https://www.wikidata.org/w/api.php",
+}
+
+
+class FixtureStore:
+    """Корпус ответов: страницы по запрошенному названию и элементы по Q-id.
+
+    Ответы хранятся по отдельным страницам и элементам, а не по целым
+    запросам, поэтому любой набор id в wbgetentities собирается из корпуса.
+    """
+
+    def __init__(self, queries=None, pages=None, entities=None):
+        self.queries = queries or []  # имена в порядке записи
+        self.pages = pages or {}
+        self.entities = entities or {}
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            data = json.load(file)
+        return cls(data["queries"], data["pages"], data["entities"])
+
+    def save(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with gzip.open(path, "wt", encoding="utf-8") as file:
+            json.dump({"queries": self.queries, "pages": self.pages,
+                       "entities": self.entities},
+                      file, ensure_ascii=False, separators=(",", ":"))
+
+    def query(self, params):
+        if params.get("generator") == "prefixsearch":
+            return self.prefixsearch(params)
+        pages = {}
+        for i, title in enumerate(params.get("titles", "").split("|")):
+            page = self.pages.get(title) or {"ns": 0, "title": title, "missing": ""}
+            pages[str(page.get("pageid", -1 - i))] = page
+        return {"batchcomplete": "", "query": {"pages": pages}}
+
+    def prefixsearch(self, params):
+        """generator=prefixsearch по названиям страниц корпуса (без опечаток)."""
+        prefix = params.get("gpssearch", "").casefold()
+        limit = int(params.get("gpslimit", 10))
+        found = {page["title"]: page for page in self.pages.values()
+                 if "missing" not in page and page["title"].casefold().startswith(prefix)}
+        titles = sorted(found)
+        pages = {}
+        for index, title in enumerate(titles[:limit], 1):
+            page = found[title]
+            pages[str(page.get("pageid", -index))] = {
+                "pageid": page.get("pageid"), "ns": 0, "title": title, "index": index,
+                "pageprops": page.get("pageprops", {}),
+                **({"thumbnail": page["thumbnail"]} if "thumbnail" in page else {}),
+            }
+        if not pages:
+            return {"batchcomplete": ""}
+        data = {"batchcomplete": "", "query": {"pages": pages}}
+        if len(titles) > limit:
+            # Как настоящий API: есть продолжение — ответ неполный
+            data["continue"] = {"gpsoffset": limit, "continue": "gpsoffset||"}
+        return data
+
+    def wbgetentities(self, params):
+        entities = {}
+        for qid in params.get("ids", "").split("|"):
+            entity = self.entities.get(qid)
+            if entity is None:
+                entities[qid] = {"id": qid, "missing": ""}
+            elif params.get("props") == "labels":
+                entities[qid] = {"type": "item", "id": qid,
+                                 "labels": entity.get("labels", {})}
+            else:
+                entities[qid] = entity
+        return {"entities": entities, "success": 1}
+
+    def record(self, params, data):
+        """Раскладывает ответ настоящего API по страницам и элементам.
+
+        Из action=query записываются только запросы одной статьи; prefixsearch
+        и пакетные запросы (titles=A|B) проходят без записи.
+        """
+        if params.get("action") == "query":
+            title = params.get("titles")
+            if (not title or "|" in title or "generator" in params
+                    or not data.get("query", {}).get("pages")):
+                return
+            if title not in self.pages:
+                self.queries.append(title)
+            self.pages[title] = next(iter(data["query"]["pages"].values()))
+        elif params.get("action") == "wbgetentities":
+            labels_only = params.get("props") == "labels"
+            for qid, entity in data.get("entities", {}).items():
+                if "missing" in entity or (labels_only and qid in self.entities):
+                    continue
+                if "sitelinks" in entity:
+                    entity["sitelinks"] = {site: link for site, link
+                                           in entity["sitelinks"].items()
+                                           if site == "ruwiki"}
+                self.entities[qid] = entity
+
+
+def synthetic_store(people, seed=1):
+    """Синтетический корпус: люди с реалистичным числом утверждений.
+
+    Нужен, когда записанного корпуса нет. Связанные элементы берутся
+    из общего пула, поэтому названия частично повторяются, как в жизни.
+    """
+    rnd = random.Random(seed)
+    pool = [f"Q{100 + i}" for i in range(3000)]
+    store = FixtureStore()
+    for qid in pool:
+        store.entities[qid] = {"type": "item", "id": qid,
+                               "labels": {"ru": {"language": "ru", "value": f"Элемент {qid}"}}}
+
+    def item(prop, qid, rank="normal"):
+        return {"mainsnak": {"snaktype": "value", "property": prop,
+                             "datavalue": {"type": "wikibase-entityid",
+                                           "value": {"entity-type": "item", "id": qid}}},
+                "type": "statement", "rank": rank,
+                "references": [{"snaks": {"P143": [{"property": "P143"}]}}]}
+
+    def value(prop, datatype, data):
+        return {"mainsnak": {"snaktype": "value", "property": prop,
+                             "datavalue": {"type": datatype, "value": data}},
+                "type": "statement", "rank": "normal"}
+
+    counts = {"P106": (1, 5), "P27": (1, 2), "P21": (1, 1), "P19": (1, 1),
+              "P20": (0, 1), "P172": (0, 1), "P140": (0, 1), "P40": (0, 6),
+              "P1412": (1, 3), "P69": (0, 3), "P166": (0, 40), "P800": (0, 10),
+              "P39": (0, 12), "P102": (0, 2)}
+    for i in range(people):
+        qid = f"Q{10_000_000 + i}"
+        title = f"Тестовый человек {i}"
+        claims = {"P31": [item("P31", "Q5", "preferred")]}
+        for prop, (low, high) in counts.items():
+            number = rnd.randint(low, high)
+            if number:
+                claims[prop] = [item(prop, rnd.choice(pool)) for _ in range(number)]
+        year = rnd.randint(1700, 1950)
+        claims["P569"] = [value("P569", "time", {"time": f"+{year}-03-0{rnd.randint(1, 9)}T00:00:00Z",
+                                                 "precision": 11})]
+        claims["P570"] = [value("P570", "time", {"time": f"+{year + rnd.randint(20, 90)}-00-00T00:00:00Z",
+                                                 "precision": 9})]
+        claims["P856"] = [value("P856", "string", f"https://example.org/{i}")]
+        claims["P2002"] = [value("P2002", "string", f"person{i}")]
+        claims["P214"] = [value("P214", "string", str(rnd.randint(10 ** 7, 10 ** 8)))]
+
+        store.queries.append(title)
+        store.pages[title] = {
+            "pageid": 1000 + i, "ns": 0, "title": title,
+            "extract": f"{title} — персонаж синтетического корпуса. " * 20,
+            "pageprops": {"wikibase_item": qid},
+            "fullurl": f"https://ru.wikipedia.org/wiki/{title.replace(' ', '_')}",
+            **({"thumbnail": {"source": f"https://upload.wikimedia.org/{i}.jpg",
+                              "width": 500, "height": 600}} if i % 3 else {}),
+        }
+        store.entities[qid] = {
+            "type": "item", "id": qid,
+            "labels": {"ru": {"language": "ru", "value": title}},
+            "descriptions": {"ru": {"language": "ru", "value": "синтетическая личность"}},
+            "aliases": {"ru": [{"language": "ru", "value": f"Человек {i}"}]},
+            "sitelinks": {"ruwiki": {"site": "ruwiki", "title": title}},
+            "claims": claims,
+        }
+    return store
+
+
+class FakeWikimedia:
+    """Сервер, отдающий корпус с задержкой и ошибками (или проксирующий API)."""
+
+    def __init__(self, store, latency=0.0, jitter=0.0, error_rate=0.0,
+                 record_path=None, seed=None):
+        self.store = store
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.record_path = record_path
+        self.requests = Counter()
+        self._random = random.Random(seed)
+        self._session = None
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_get("/{api}/w/api.php", self.handle)
+        app.router.add_get("/queries", self.queries)
+        app.router.add_get("/stats", self.stats)
+        app.router.add_post("/stats/reset", self.reset)
+        app.router.add_post("/save", self.save)
+        app.on_cleanup.append(self._cleanup)
+        return app
+
+    async def handle(self, request):
+        api = request.match_info["api"]
+        if api not in UPSTREAMS:
+            raise web.HTTPNotFound()
+        params = dict(request.query)
+        action = params.get("action", "?")
+        self.requests[f"{api}:{action}"] += 1
+
+        if self.record_path:
+            return web.json_response(await self._proxy(api, params))
+
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.requests["errors"] += 1
+            return web.Response(status=503, text="Service Unavailable")
+
+        if action == "query":
+            return web.json_response(self.store.query(params))
+        if action == "wbgetentities":
+            return web.json_response(self.store.wbgetentities(params))
+        return web.json_response({"error": {"code": "badvalue",
+                                            "info": f"action={action}"}})
+
+    async def _proxy(self, api, params):
+        if self._session is None:
+            self._session = ClientSession(headers={
+                "User-Agent": "HistoriographerBot/1.0 (fixture recorder)"})
+        async with self._session.get(UPSTREAMS[api], params=params) as response:
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+        self.store.record(params, data)
+        return data
+
+    async def queries(self, request):
+        return web.json_response(self.store.queries)
+
+    async def stats(self, request):
+        return web.json_response(dict(self.requests))
+
+    async def reset(self, request):
+        self.requests.clear()
+        return web.json_response({})
+
+    async def save(self, request):
+        if self.record_path:
+            self.store.save(self.record_path)
+        return web.json_response({"queries": len(self.store.queries),
+                                  "entities": len(self.store.entities)})
+
+    async def _cleanup(self, app):
+        if self._session is not None:
+            await self._session.close()
+        if self.record_path:
+            self.store.save(self.record_path)
+
+
+def load_store(fixtures, synthetic):
+    """Записанный корпус, если он есть, иначе синтетический."""
+    if fixtures and Path(fixtures).exists():
+        return FixtureStore.load(fixtures)
+    return synthetic_store(synthetic)
+
+
+def add_arguments(parser):
+    parser.add_argument("--fixtures", default=str(DEFAULT_FIXTURES),
+                        help="файл корпуса (.json.gz)")
+    parser.add_argument("--synthetic", type=int, default=300,
+                        help="сколько синтетических людей создать, если корпуса нет")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="задержка ответа, с")
+    parser.add_argument("--jitter", type=float, default=0.02,
+                        help="случайная добавка к задержке, до стольких секунд")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="доля ответов 503")
+    parser.add_argument("--record", action="store_true",
+                        help="проксировать настоящие API и записывать корпус в --fixtures")
+
+
+def create_server(args):
+    if args.record:
+        store = (FixtureStore.load(args.fixtures) if Path(args.fixtures).exists()
+                 else FixtureStore())
+        return FakeWikimedia(store, record_path=args.fixtures)
+    return FakeWikimedia(load_store(args.fixtures, args.synthetic),
+                         latency=args.latency, jitter=args.jitter,
+                         error_rate=args.error_rate)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    web.run_app(create_server(args).make_app(), host="127.0.0.1", port=args.port)